@@ -4,120 +4,646 @@ Grailed Listing Agent with State-Aware Browser Automation
 Fixes the critical issue of not tracking browser state/page context
 """
 
+import asyncio
+import contextvars
+import hashlib
+import importlib.util
 import json
 import logging
 import os
+import shutil
+import sqlite3
+import stat
+import string
+import subprocess
 import sys
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, wait
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, Iterable, Iterator, List, Any, Optional
+from urllib.parse import urlparse
+
+# Logging is configured by main(); importing this module installs no handlers
+logging.getLogger("strands").addHandler(logging.NullHandler())
+logger = logging.getLogger("grailed_agent")
 
 # Load environment variables from .env file
 try:
     from dotenv import load_dotenv
     load_dotenv()
-    print("✅ Loaded .env file")
+    logger.debug("Loaded .env file")
 except ImportError:
-    print("⚠️  python-dotenv not installed, using system environment variables only")
+    logger.info("python-dotenv not installed, using system environment variables only")
 
-# Configure logging
-logging.basicConfig(
-    format="%(levelname)s | %(name)s | %(message)s",
-    handlers=[logging.StreamHandler()]
-)
-logging.getLogger("strands").setLevel(logging.INFO)
+def _env_number(name: str, default, parse=float):
+    """Numeric setting from the environment; a malformed value warns and falls back to the default"""
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    try:
+        return parse(value)
+    except ValueError:
+        logger.warning("Ignoring %s=%r: expected a %s, using %s", name, value, "whole number" if parse is int else "number", default)
+        return default
+
+def _configure_logging(verbose: bool = False) -> None:
+    """Send log records to stderr; setup diagnostics and Strands' INFO chatter only with --verbose"""
+    logging.basicConfig(
+        format="%(levelname)s | %(name)s | %(message)s",
+        handlers=[logging.StreamHandler()]
+    )
+    level = logging.INFO if verbose else logging.WARNING
+    logging.getLogger("strands").setLevel(level)
+    logger.setLevel(level)
 
+# Only the @tool decorator is needed at import time; Agent, strands_tools and MCP
+# are imported lazily by the functions that use them. Without Strands the tools stay
+# plain functions, so `validate` still works; the agent commands refuse to start.
 try:
-    from strands import Agent, tool
-    from strands_tools import file_read, file_write
-    print("✅ Successfully imported Strands Agents SDK")
+    from strands import tool
+    from strands.types._events import ToolResultEvent
+    from strands.types.tools import AgentTool
+    _STRANDS_IMPORT_ERROR = None
+    logger.debug("Imported Strands Agents SDK")
 except ImportError as e:
-    print(f"❌ Error importing Strands Agents SDK: {e}")
-    print("Please install: pip install strands-agents strands-agents-tools")
-    sys.exit(1)
+    _STRANDS_IMPORT_ERROR = e
+    AgentTool = object
+    
+    def tool(func):
+        return func
 
-# Import additional libraries for custom image handling with Gemini
-import base64
+# Faster listings parsing when orjson is installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-# Import MCP for Playwright browser automation
+# Incremental listings parsing when ijson is installed, for catalogs too large to load at once
 try:
-    from mcp import StdioServerParameters, stdio_client
-    from strands.tools.mcp import MCPClient
-    print("✅ Successfully imported MCP tools")
-except ImportError as e:
-    print(f"❌ Error importing MCP tools: {e}")
-    sys.exit(1)
+    import ijson
+except ImportError:
+    ijson = None
 
-@tool
-def gemini_image_reader(image_path: str) -> str:
-    """
-    Read and encode JPG image for Gemini API using base64 format.
-    This is specifically designed to work with Gemini's OpenAI-compatible endpoint.
-    """
+import snapshot_budget
+
+# Grailed metadata schema, built once at import instead of on every validation call
+_REQUIRED_METADATA_FIELDS = (
+    "department", "category", "sub_category", "designer", "item_name",
+    "size", "color", "condition", "price", "description", "image_paths"
+)
+_OPTIONAL_METADATA_FIELDS = ("accept_offers", "smart_pricing", "country_of_origin")
+_KNOWN_METADATA_FIELDS = frozenset(_REQUIRED_METADATA_FIELDS + _OPTIONAL_METADATA_FIELDS)
+_JPG_SUFFIXES = ('.jpg', '.jpeg')  # tuple so str.endswith can take it directly
+
+# Optional on-disk result cache shared across CLI runs (enable with GRAILED_AGENT_CACHE=1)
+_CACHE_DIR = Path("~/.cache/grailed_agent").expanduser()
+_disk_cache_conn = None
+_disk_cache_lock = threading.Lock()
+
+def _disk_cache_enabled() -> bool:
+    """Whether the on-disk result cache is switched on"""
+    return os.getenv("GRAILED_AGENT_CACHE") == "1"
+
+def _disk_cache():
+    """Open the sqlite result cache on first use; returns None when caching is disabled"""
+    global _disk_cache_conn
+    if not _disk_cache_enabled():
+        return None
+    if _disk_cache_conn is None:
+        _CACHE_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+        # Tools run on worker threads, so share one connection behind a lock
+        conn = sqlite3.connect(_CACHE_DIR / "cache.sqlite3", check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB)")
+        _disk_cache_conn = conn
+    return _disk_cache_conn
+
+def _disk_cache_key(kind: str, material: str) -> str:
+    """Build a cache key from a namespace and the hashed input"""
+    return f"{kind}:{hashlib.sha1(material.encode()).hexdigest()}"
+
+def _disk_cache_get(key: str) -> Any:
+    """Return the cached JSON value for key, or None on a miss"""
+    try:
+        with _disk_cache_lock:
+            conn = _disk_cache()
+            if conn is None:
+                return None
+            row = conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+    except sqlite3.Error:
+        return None
+    return json.loads(row[0]) if row else None
+
+def _disk_cache_put(key: str, value: Any) -> None:
+    """Store a JSON-serializable value; cache failures never break the caller"""
+    try:
+        with _disk_cache_lock:
+            conn = _disk_cache()
+            if conn is None:
+                return
+            conn.execute("INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+            conn.commit()
+    except sqlite3.Error:
+        pass
+
+def _read_image(image_path: str) -> Dict[str, Any]:
+    """Return one JPG as an image content block (or an error text block); shared by the single and batch readers"""
     try:
         # Expand the path
-        expanded_path = Path(image_path).expanduser().resolve()
+        expanded_path = os.path.abspath(os.path.expanduser(image_path))
         
-        if not expanded_path.exists():
-            return f"Error: Image file not found: {image_path}"
+        try:
+            file_stat = os.stat(expanded_path)
+        except OSError:
+            file_stat = None
+        if file_stat is None or not stat.S_ISREG(file_stat.st_mode):
+            return {"text": f"Error: Image file not found: {image_path}"}
         
         # Validate JPG format
-        if not expanded_path.suffix.lower() in ['.jpg', '.jpeg']:
-            raise ValueError(f"Invalid image format: {expanded_path.suffix}. Only JPG/JPEG files are supported.")
-        
-        # Read and encode the image
-        with open(expanded_path, "rb") as image_file:
-            base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-        
-        # Return the data URL format that Gemini expects
-        data_url = f"data:image/jpeg;base64,{base64_image}"
+        if not expanded_path.lower().endswith(_JPG_SUFFIXES):
+            suffix = os.path.splitext(expanded_path)[1]
+            raise ValueError(f"Invalid image format: {suffix}. Only JPG/JPEG files are supported.")
+        data = Path(expanded_path).read_bytes()
+        if not data:
+            raise ValueError("Image file is empty")
         
-        return f"Image successfully loaded from {image_path}. Data URL ready for Gemini API."
+        # Raw bytes in an image block reach the model as an image, not as base64 text in the context
+        return {"image": {"format": "jpeg", "source": {"bytes": data}}}
         
     except Exception as e:
-        return f"Error reading image {image_path}: {str(e)}"
+        return {"text": f"Error reading image {image_path}: {str(e)}"}
+
+@tool
+def gemini_image_reader(image_path: str) -> Dict[str, Any]:
+    """
+    Read a JPG image so the model can see it.
+    Returns the image as an image content block, or an error message.
+    """
+    block = _read_image(image_path)
+    return {"status": "error" if "text" in block else "success", "content": [block]}
+
+@tool
+def gemini_images_reader(image_paths: List[str]) -> Dict[str, Any]:
+    """
+    Read several JPG images in one call so the model can see them.
+    Prefer this over calling gemini_image_reader once per image.
+    """
+    # File reads release the GIL, so a small pool overlaps the disk I/O of a listing's images
+    with ThreadPoolExecutor(max_workers=min(8, len(image_paths) or 1)) as executor:
+        blocks = list(executor.map(_read_image, image_paths))
+    # Label each image with its path so the model can tell them apart
+    content = []
+    for image_path, block in zip(image_paths, blocks):
+        if "image" in block:
+            content.append({"text": image_path})
+        content.append(block)
+    return {"status": "success", "content": content}
+
+# Below this many images in one folder, a stat each is cheaper than listing the folder
+_SCANDIR_MIN_PATHS = 3
+
+def _scan_image_dirs(parents) -> Dict[str, Any]:
+    """List each directory once, mapping it to the set of file names in it, or None if unreadable"""
+    listings = {}
+    for parent in parents:
+        try:
+            with os.scandir(parent) as entries:
+                listings[parent] = {entry.name for entry in entries if entry.is_file()}
+        except OSError:
+            listings[parent] = None
+    return listings
 
 @tool
 def expand_image_paths(image_paths: List[str]) -> List[str]:
     """Expand and validate image file paths"""
-    expanded_paths = []
-    for path in image_paths:
-        expanded_path = Path(path).expanduser().resolve()
-        if expanded_path.exists():
-            expanded_paths.append(str(expanded_path))
-        else:
-            print(f"⚠️  Warning: Image file not found: {path}")
-            expanded_paths.append(str(expanded_path))  # Include anyway for debugging
+    # abspath is a string operation; resolving symlinks would lstat every path component
+    expanded_paths = [os.path.abspath(os.path.expanduser(path)) for path in image_paths]
+    
+    # Group by folder so images sharing a directory cost one scandir instead of a stat each
+    by_parent = defaultdict(list)
+    for path, expanded in zip(image_paths, expanded_paths):
+        parent, name = os.path.split(expanded)
+        by_parent[parent].append((path, expanded, name))
+    
+    dir_listings = _scan_image_dirs(parent for parent, group in by_parent.items() if len(group) >= _SCANDIR_MIN_PATHS)
+    for parent, group in by_parent.items():
+        listing = dir_listings.get(parent)
+        for path, expanded, name in group:
+            # Re-check misses directly: case-insensitive filesystems (macOS default) match names the listing doesn't
+            found = listing is not None and name in listing
+            if not found and not os.path.isfile(expanded):
+                logger.warning("Image file not found: %s", path)  # Included anyway for debugging
+    
     return expanded_paths
 
+@lru_cache(maxsize=256)
+def _metadata_verdict(present: frozenset, image_paths: tuple) -> tuple:
+    """Missing required fields and the first non-JPG image suffix (or None) for one field set and image list"""
+    missing = tuple(field for field in _REQUIRED_METADATA_FIELDS if field not in present)
+    for image_path in image_paths:
+        if not image_path.lower().endswith(_JPG_SUFFIXES):
+            return missing, os.path.splitext(image_path)[1]
+    return missing, None
+
+def _image_paths_of(metadata: Dict[str, Any]) -> tuple:
+    """A listing's image_paths as a tuple (hashable for _metadata_verdict); raises ValueError unless it is a list of strings"""
+    image_paths = metadata.get("image_paths", ())
+    if not isinstance(image_paths, (list, tuple)) or not all(isinstance(path, str) for path in image_paths):
+        raise ValueError("image_paths must be a list of file paths")
+    return tuple(image_paths)
+
 @tool
 def validate_grailed_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
     """Validate and normalize Grailed-specific metadata"""
-    required_fields = [
-        "department", "category", "sub_category", "designer", "item_name",
-        "size", "color", "condition", "price", "description", "image_paths"
-    ]
+    # One set intersection up front answers every membership question below
+    present = metadata.keys() & _KNOWN_METADATA_FIELDS
+    image_paths = _image_paths_of(metadata)
+    if not present:
+        logger.warning("Missing required fields: %s", ", ".join(_REQUIRED_METADATA_FIELDS))
+        return {}
     
-    validated = {}
-    for field in required_fields:
-        if field in metadata:
-            validated[field] = metadata[field]
-        else:
-            print(f"⚠️  Missing required field: {field}")
+    # Only the verdict is cached, keyed on what it depends on, so a hit returns the same
+    # objects as a miss instead of a JSON round-trip of the listing
+    key = _disk_cache_key("metadata", json.dumps([sorted(present), image_paths]))
+    cached = _disk_cache_get(key)
+    if cached is not None:
+        missing = cached["missing"]
+    else:
+        # Retries re-validate the same listing, so the field and image checks are memoized on hashable inputs
+        missing, bad_suffix = _metadata_verdict(frozenset(present), image_paths)
+        
+        # Validate image paths are JPG format
+        if bad_suffix is not None:
+            raise ValueError(f"Invalid image format: {bad_suffix}. Only JPG/JPEG files are supported for Gemini API.")
+        _disk_cache_put(key, {"missing": list(missing)})
+    if missing:
+        logger.warning("Missing required fields: %s", ", ".join(missing))
+    
+    # Copy on write: metadata without unknown keys is already normalized, so hand it back as-is
+    if len(present) == len(metadata):
+        validated = metadata
+    else:
+        validated = {
+            field: metadata[field]
+            for field in _REQUIRED_METADATA_FIELDS + _OPTIONAL_METADATA_FIELDS
+            if field in present
+        }
+    return validated
+
+@tool
+def validate_grailed_metadata_bulk(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Validate a whole batch of listings in one tool call.
+    Prefer this over calling validate_grailed_metadata once per item.
+    """
+    results = []
+    for index, metadata in enumerate(items):
+        if not isinstance(metadata, dict):
+            results.append({"index": index, "valid": False, "error": "item must be an object"})
+            continue
+        try:
+            validated = validate_grailed_metadata(metadata)
+        except ValueError as e:
+            results.append({"index": index, "valid": False, "error": str(e)})
+            continue
+        results.append({
+            "index": index,
+            "valid": True,
+            "metadata": validated,
+            "missing_fields": [field for field in _REQUIRED_METADATA_FIELDS if field not in metadata]
+        })
+    return results
+
+# Browser tools that only read the page; any other browser tool may change it
+_READ_ONLY_BROWSER_TOOLS = frozenset({
+    "browser_snapshot", "browser_take_screenshot", "browser_console_messages",
+    "browser_network_requests", "browser_tab_list"
+})
+
+def _content_text(content: List[Dict[str, Any]]) -> str:
+    """Join the text blocks of an MCP tool result"""
+    return "\n".join(block["text"] for block in content if "text" in block)
+
+class SnapshotCache:
+    """
+    Last accessibility-tree snapshot of the active tab.
+    Stays valid until a page-changing browser tool runs, which bumps nav_token,
+    so repeated read-only state checks skip the CDP tree walk.
+    """
     
-    # Validate image paths are JPG format
-    if "image_paths" in metadata:
-        for image_path in metadata["image_paths"]:
-            path = Path(image_path)
-            if not path.suffix.lower() in ['.jpg', '.jpeg']:
-                raise ValueError(f"Invalid image format: {path.suffix}. Only JPG/JPEG files are supported for Gemini API.")
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entry = None  # (nav_token, MCP result content)
+        self._client = None
+        self.nav_token = 0
+        self.history = deque(maxlen=10)  # recently visited URLs, for the breadcrumb
+        self._shown = None  # (URL, elements) the model was last shown of a page, for diffs
     
-    # Add optional fields
-    optional_fields = ["accept_offers", "smart_pricing", "country_of_origin"]
-    for field in optional_fields:
-        if field in metadata:
-            validated[field] = metadata[field]
+    def attach(self, playwright_client) -> None:
+        """Use this MCP client for snapshots requested by the state tools"""
+        self._client = playwright_client
+        self.invalidate()
     
-    return validated
+    @property
+    def client(self):
+        """MCP client of the browser this cache tracks, or None"""
+        return self._client
+    
+    def invalidate(self) -> None:
+        with self._lock:
+            self.nav_token += 1
+            self._entry = None
+    
+    def get(self) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            if self._entry is not None and self._entry[0] == self.nav_token:
+                return self._entry[1]
+            return None
+    
+    def put(self, content: List[Dict[str, Any]], nav_token: int) -> None:
+        """Store a snapshot taken at nav_token; dropped if the page changed meanwhile"""
+        url = snapshot_budget.page_url(_content_text(content))
+        with self._lock:
+            if url and (not self.history or self.history[-1] != url):
+                self.history.append(url)
+            if nav_token == self.nav_token:
+                self._entry = (nav_token, content)
+    
+    def render(self, content: List[Dict[str, Any]], full: bool = False, **budget) -> List[Dict[str, Any]]:
+        """
+        Prepare snapshot text blocks for the model: a JSON diff when the page is the same
+        as the last snapshot shown and few elements changed, otherwise the token-budgeted
+        tree (see snapshot_budget), or the untouched text when full is set.
+        Diffs compare only elements within the budget, so they never name a ref the model hasn't seen.
+        """
+        rendered = []
+        for block in content:
+            text = block.get("text")
+            header, tree, trailer = snapshot_budget.split_snapshot(text or "")
+            if tree is None:
+                rendered.append(block)
+                continue
+            
+            url = snapshot_budget.page_url(text)
+            elements = snapshot_budget.parse_elements(tree)
+            if not full:
+                reserved = snapshot_budget.estimate_tokens(header) + snapshot_budget.estimate_tokens(trailer)
+                elements = [elements[i] for i in snapshot_budget.select_elements(elements, reserved, **budget)]
+            with self._lock:
+                shown, self._shown = self._shown, (url, elements)
+            
+            diff = None
+            if not full and shown is not None and shown[0] == url:
+                diff = snapshot_budget.diff_elements(shown[1], elements)
+            if diff is not None:
+                text = snapshot_budget.render_diff(text, diff)
+            elif not full:
+                text = snapshot_budget.compact_snapshot(text, self.history, **budget)
+            rendered.append({"text": text})
+        return rendered
+    
+    def current(self, force: bool = False) -> Optional[List[Dict[str, Any]]]:
+        """Return the raw snapshot content of the page, fetching it over MCP on a miss; None if unavailable"""
+        content = None if force else self.get()
+        if content is None:
+            if self._client is None:
+                return None
+            nav_token = self.nav_token
+            try:
+                result = self._client.call_tool_sync("grailed-snapshot-cache", "browser_snapshot", {})
+            except Exception as e:
+                logger.debug("Snapshot fetch failed: %s", e)
+                return None
+            if result.get("status") != "success":
+                return None
+            content = result["content"]
+            self.put(content, nav_token)
+        return content
+    
+    def snapshot_text(self, force: bool = False) -> Optional[str]:
+        """Return the current compacted snapshot text; None if unavailable"""
+        content = self.current(force)
+        return None if content is None else _content_text(self.render(content))
+
+_snapshot_cache = SnapshotCache()
+# Cache the state tools read from; concurrent listing workers each set their own
+_active_snapshot_cache = contextvars.ContextVar("active_snapshot_cache", default=_snapshot_cache)
+
+# Extra browser_snapshot arguments handled by SnapshotCachingTool itself
+_SNAPSHOT_OPTIONS = {
+    "force": {"type": "boolean", "description": "Bypass the snapshot cache and re-read the page"},
+    "full_snapshot": {"type": "boolean", "description": "Return the whole tree instead of the token-budgeted view"},
+    "max_elements": {"type": "integer", "description": f"Elements to keep (default {snapshot_budget.DEFAULT_MAX_ELEMENTS})"},
+    "max_tokens": {"type": "integer", "description": f"Token budget (default {snapshot_budget.DEFAULT_MAX_TOKENS})"}
+}
+
+class SnapshotCachingTool(AgentTool):
+    """
+    Wraps an MCP Playwright tool so browser_snapshot is answered from the SnapshotCache
+    while the page is unchanged, page-changing tools invalidate it, and snapshots
+    handed back to the model are diffed or token-budgeted.
+    """
+    
+    def __init__(self, inner: AgentTool, cache: SnapshotCache):
+        super().__init__()
+        self._inner = inner
+        self._cache = cache
+    
+    @property
+    def tool_name(self) -> str:
+        return self._inner.tool_name
+    
+    @property
+    def tool_spec(self):
+        spec = self._inner.tool_spec
+        if self.tool_name != "browser_snapshot":
+            return spec
+        
+        schema = dict(spec["inputSchema"]["json"])
+        schema["properties"] = {**schema.get("properties", {}), **_SNAPSHOT_OPTIONS}
+        return {**spec, "inputSchema": {"json": schema}}
+    
+    @property
+    def tool_type(self) -> str:
+        return self._inner.tool_type
+    
+    async def stream(self, tool_use, invocation_state, **kwargs):
+        full_snapshot = False
+        budget = {}
+        if self.tool_name == "browser_snapshot":
+            tool_input = dict(tool_use.get("input") or {})
+            force = bool(tool_input.pop("force", False))
+            full_snapshot = bool(tool_input.pop("full_snapshot", False))
+            for option in ("max_elements", "max_tokens"):
+                if option in tool_input:
+                    budget[option] = int(tool_input.pop(option))
+            
+            cached = None if force else self._cache.get()
+            if cached is not None:
+                content = self._cache.render(cached, full_snapshot, **budget)
+                yield ToolResultEvent({"toolUseId": tool_use["toolUseId"], "status": "success", "content": content})
+                return
+            tool_use = {**tool_use, "input": tool_input}
+        elif self.tool_name not in _READ_ONLY_BROWSER_TOOLS:
+            self._cache.invalidate()
+        
+        nav_token = self._cache.nav_token
+        async for event in self._inner.stream(tool_use, invocation_state, **kwargs):
+            result = event.get("tool_result") if isinstance(event, dict) else None
+            # Playwright MCP appends the post-action page snapshot to most results; cache and budget it too
+            if (result and result.get("status") == "success"
+                    and (self.tool_name == "browser_snapshot" or "Page Snapshot" in _content_text(result["content"]))):
+                self._cache.put(result["content"], nav_token)
+                event = ToolResultEvent({**result, "content": self._cache.render(result["content"], full_snapshot, **budget)})
+            yield event
+
+# How every state tool reads the page; shared so the tool texts the model sees stay short
+_SNAPSHOT_PARSE_HINT = "Parse URL, elements, page title, and text content"
+_STATE_RULES = f"""Use the snapshot attached below (or browser_snapshot if none is attached) for the page accessibility tree and content.
+{_SNAPSHOT_PARSE_HINT} from it."""
+
+_DETECT_STATE_DOC = f"""
+DETECT PAGE STATE:
+1. homepage: URL "grailed.com" or "grailed.com/"; a[data-testid="desktop-sell"]; title contains "Grailed"
+2. login_popup: div[role="dialog"], .modal, .login-popup; input[type="email"], input[type="password"]; "Sign In"/"Log In"
+3. sell_page: URL contains "/sell", "/create" or "/listing"; select[name="department"], input[name="title"]; "Create Listing"/"Sell Item"
+4. profile: URL contains "/users/" or "/profile"; avatar or account settings
+5. unknown: none of the above
+
+{_STATE_RULES}
+Return one of: "homepage", "login_popup", "sell_page", "profile", "unknown".
+"""
+
+_NAVIGATE_SELL_DOC = f"""
+NAVIGATE TO SELL PAGE:
+1. detect_current_page_state()
+2. homepage: click a[data-testid="desktop-sell"]; browser_wait_for text "Department" (no sleeping); check for login popup
+3. login_popup: prompt_user_login(), then check state again and continue to the sell page
+4. sell_page: confirm form elements are present, then proceed
+5. unknown: navigate to https://www.grailed.com, then follow step 2
+6. After each step, browser_snapshot: {_SNAPSHOT_PARSE_HINT}; confirm expected elements and the sell page URL
+
+Never fill forms before the sell page is verified.
+"""
+
+_VERIFY_SELL_DOC = f"""
+VERIFY SELL PAGE READY:
+1. URL contains "/sell"
+2. Form elements: select[name="department"]; input[name="title"] or input[name="name"];
+   input[name="price"] or input[type="number"]; textarea[name="description"]; image upload / file input
+3. "Sell" or "Create Listing" text
+4. No blocking .modal, .popup or div[role="dialog"]
+   - In a "Changes since the previous snapshot" diff: dialog in "added" = modal opened, in "removed" = closed;
+     "unchanged" refs are still on the page
+5. Fields interactable, none disabled or loading; if still loading, browser_wait_for text "Department" and recheck (no sleeping)
+
+{_STATE_RULES}
+Return "READY", or what is missing/wrong.
+"""
+
+_WAIT_AND_RETRY_TEMPLATE = string.Template("""
+RETRY: $action_description
+1. browser_wait_for the text proving the page is ready (e.g. "Department" for the sell form, "Sell" for the homepage)
+2. detect_current_page_state()
+3. Attempt the action
+4. On failure: screenshot to see why, then browser_wait_for time=0.05, 0.1, 0.2, 0.4, 0.8, 1.5 s before successive retries
+5. Report failure after $max_retries retries
+
+For: navigation clicks, form elements appearing, dynamic content.
+""")
+
+def _with_cached_snapshot(instructions: str) -> str:
+    """Attach the current page snapshot to a state tool's instructions when one is available"""
+    snapshot = _active_snapshot_cache.get().snapshot_text()
+    if snapshot is None:
+        return instructions
+    return f"{instructions}\nCURRENT PAGE SNAPSHOT (already captured, no need to call browser_snapshot):\n{snapshot}\n"
+
+def _is_grailed_url(url: str) -> bool:
+    """True for grailed.com and its subdomains, not look-alikes such as evilgrailed.com"""
+    host = urlparse(url).hostname or ""
+    return host == "grailed.com" or host.endswith(".grailed.com")
+
+def _classify_page(path: str, elements: List[Dict[str, str]]) -> Optional[str]:
+    """Page state for a URL path and its snapshot elements when simple rules can tell, else None"""
+    if any(e["role"] in ("dialog", "alertdialog") for e in elements):
+        login_fields = any(
+            e["role"] == "textbox" and ("email" in e["name"].lower() or "password" in e["name"].lower())
+            for e in elements
+        )
+        return "login_popup" if login_fields else None
+    return _classify_path(path)
+
+def _classify_path(path: str) -> Optional[str]:
+    """Page state implied by a grailed.com URL path alone, or None"""
+    # Compare whole path segments: /sellers/... is not the sell form
+    segment = path.split("/", 2)[1] if path.startswith("/") else path
+    if segment == "sell":
+        return "sell_page"
+    if segment == "profile" or (segment == "users" and path.startswith("/users/")):
+        return "profile"
+    if path in ("", "/"):
+        return "homepage"
+    return None
+
+# Everything the state rules need, gathered by one browser_evaluate round trip
+_PAGE_PROBE_SCRIPT = """() => ({
+  url: location.href,
+  title: document.title,
+  sell: !!document.querySelector('a[data-testid="desktop-sell"]'),
+  login: !!document.querySelector('div[role="dialog"] input[type="email"], div[role="dialog"] input[type="password"]'),
+  dept: !!document.querySelector('select[name="department"]'),
+  account: !!document.querySelector('a[href^="/users/"], a[href*="/myaccount"], [data-testid*="avatar" i]'),
+  overlay: !!document.querySelector('.modal, .popup, div[role="dialog"]')
+})"""
+
+def _probe_page(playwright_client) -> Optional[Dict[str, Any]]:
+    """Run _PAGE_PROBE_SCRIPT in the page; None if there is no browser or the result can't be read"""
+    if playwright_client is None:
+        return None
+    try:
+        result = playwright_client.call_tool_sync("grailed-page-probe", "browser_evaluate", {"function": _PAGE_PROBE_SCRIPT})
+    except Exception as e:
+        logger.debug("Page probe failed: %s", e)
+        return None
+    if result.get("status") != "success":
+        return None
+    
+    # The result text wraps the returned object in markdown; decode the first JSON object in it
+    text = _content_text(result.get("content", []))
+    start = text.find("{")
+    try:
+        probe, _ = json.JSONDecoder().raw_decode(text, start)
+    except ValueError:
+        return None
+    return probe if isinstance(probe, dict) else None
+
+def _classify_probe(probe: Dict[str, Any]) -> Optional[str]:
+    """Page state from a _PAGE_PROBE_SCRIPT result, or None when the model should decide"""
+    url = str(probe.get("url", ""))
+    if not _is_grailed_url(url):
+        return None
+    if probe.get("login"):
+        return "login_popup"
+    if probe.get("overlay"):
+        return None
+    if probe.get("dept"):
+        return "sell_page"
+    return _classify_path(urlparse(url).path)
+
+def _known_page_state(content: List[Dict[str, Any]]) -> Optional[str]:
+    """Classify a raw snapshot via _classify_page; None when the model should look at it"""
+    text = _content_text(content)
+    _, tree, _ = snapshot_budget.split_snapshot(text)
+    url = snapshot_budget.page_url(text) or ""
+    if tree is None or not _is_grailed_url(url):
+        return None
+    
+    return _classify_page(urlparse(url).path, snapshot_budget.parse_elements(tree))
 
 @tool
 def detect_current_page_state() -> str:
@@ -125,41 +651,23 @@ def detect_current_page_state() -> str:
     Detect what page/state the browser is currently in using text-based analysis.
     This is CRITICAL for state-aware automation.
     """
-    return """
-CRITICAL: Use browser_snapshot to detect current page state by analyzing:
-
-1. **Homepage/Landing Page**:
-   - URL contains just "grailed.com" or "grailed.com/"
-   - Look for: a[data-testid="desktop-sell"] (sell button)
-   - Page title contains "Grailed"
-   - Navigation elements present
-
-2. **Login Modal/Popup State**:
-   - Look for: div[role="dialog"], .modal, .login-popup
-   - Login form elements: input[type="email"], input[type="password"]
-   - "Sign In" or "Log In" buttons/text
-   - Modal overlay blocking main content
-
-3. **Sell/Create Listing Page**:
-   - URL contains "/sell" or "/create" or "/listing"
-   - Form elements: select[name="department"], input[name="title"]
-   - "Create Listing" or "Sell Item" text
-   - Product form fields visible
-
-4. **Profile/Account Page**:
-   - URL contains "/users/" or "/profile"
-   - User avatar or account settings visible
-   - User-specific content and navigation
-
-5. **Other/Unknown Page**:
-   - Check URL and page title
-   - Look for navigation elements
-   - Analyze page content structure
-
-Use browser_snapshot to get page accessibility tree and content.
-Parse URL, elements, page title, and text content to determine state.
-Return the detected state clearly: "homepage", "login_popup", "sell_page", "profile", or "unknown".
-"""
+    # A page recognized from its snapshot needs no model round trip to classify
+    snapshot_cache = _active_snapshot_cache.get()
+    content = snapshot_cache.get()
+    if content is not None:
+        state = _known_page_state(content)
+        if state is not None:
+            return f"STATE={state} (recognized from the current snapshot)"
+        return _with_cached_snapshot(_DETECT_STATE_DOC)
+    
+    # No fresh snapshot: one browser_evaluate answers the state questions instead of several tool calls
+    probe = _probe_page(snapshot_cache.client)
+    if probe is None:
+        return _with_cached_snapshot(_DETECT_STATE_DOC)
+    state = _classify_probe(probe)
+    if state is not None:
+        return f"STATE={state} (recognized from a page probe)"
+    return f"{_DETECT_STATE_DOC}\nPAGE PROBE (url, title and which key elements exist; no need to call browser_evaluate):\n{json.dumps(probe)}\n"
 
 @tool
 def navigate_to_sell_page() -> str:
@@ -167,39 +675,11 @@ def navigate_to_sell_page() -> str:
     Navigate to the sell page with proper state checking.
     This ensures we're on the right page before proceeding.
     """
-    return """
-STEP-BY-STEP NAVIGATION TO SELL PAGE:
-
-1. **Check Current State First**:
-   - Use detect_current_page_state() to see where we are
-   - Use browser_snapshot to analyze page content and URL
-
-2. **If on Homepage**:
-   - Look for sell button: a[data-testid="desktop-sell"]
-   - Click the sell button
-   - Wait 2-3 seconds for navigation
-   - Check for login popup immediately after click
-
-3. **If Login Popup Appears**:
-   - Use prompt_user_login() to handle popup
-   - After user completes login, check state again
-   - Navigate to sell page if not already there
-
-4. **If Already on Sell Page**:
-   - Verify form elements are present
-   - Proceed with listing creation
-
-5. **If on Unknown Page**:
-   - Navigate to https://www.grailed.com first
-   - Then follow homepage flow
-
-6. **State Verification**:
-   - After each navigation step, use browser_snapshot to confirm success
-   - Parse the accessibility tree to verify expected elements are present
-   - Check URL and page content match expected sell page pattern
-
-ALWAYS verify you're on the sell page before trying to fill forms!
-"""
+    # The browser usually sits on the sell page from the previous listing; don't reload it
+    content = _active_snapshot_cache.get().current()
+    if content is not None and _known_page_state(content) == "sell_page":
+        return "ALREADY_ON_SELL_PAGE"
+    return _NAVIGATE_SELL_DOC
 
 @tool
 def verify_sell_page_ready() -> str:
@@ -207,71 +687,126 @@ def verify_sell_page_ready() -> str:
     Verify that we're on the sell page and form is ready for input.
     This prevents trying to fill forms on wrong pages.
     """
-    return """
-VERIFY SELL PAGE IS READY:
-
-Use browser_snapshot to check these elements and confirm sell page is loaded and ready:
-
-1. **URL Check**: 
-   - URL should contain "/sell" or similar
-   - Parse URL from browser_snapshot accessibility tree
-
-2. **Form Elements Present**:
-   - Department dropdown: select[name="department"] or similar
-   - Title/Name input: input[name="title"] or input[name="name"]
-   - Price input: input[name="price"] or input[type="number"]
-   - Description textarea: textarea[name="description"]
-   - Image upload area or file input elements
+    return _with_cached_snapshot(_VERIFY_SELL_DOC)
 
-3. **Page Title and Content**:
-   - Should contain "Sell" or "Create Listing" text
-   - Page structure should match sell page layout
+# Cookies and local storage captured after a manual login, so isolated browsers start signed in
+_STORAGE_STATE = _CACHE_DIR / "storage_state.json"
 
-4. **No Overlays/Modals**:
-   - Ensure no login popups or other modals are blocking the form
-   - Check for overlay elements: .modal, .popup, div[role="dialog"]
-   - Verify main form content is accessible
+def _save_storage_state(playwright_client) -> None:
+    """Have the MCP server's browser write its storage state to _STORAGE_STATE (best effort)"""
+    if playwright_client is None:
+        return
+    try:
+        # Session cookies live here, so keep the directory and the file private to the user
+        _STORAGE_STATE.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        result = playwright_client.call_tool_sync("grailed-storage-state", "browser_run_code", {
+            "code": f"async (page) => {{ await page.context().storageState({{ path: {json.dumps(str(_STORAGE_STATE))} }}); }}"
+        })
+        if result.get("status") == "success":
+            os.chmod(_STORAGE_STATE, 0o600)
+        elif logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Could not save browser storage state: %s", _content_text(result.get("content", [])))
+    except Exception as e:
+        logger.debug("Could not save browser storage state: %s", e)
 
-5. **Form Readiness**:
-   - All required form fields should be present and interactable
-   - No loading states or disabled elements blocking interaction
-   - Form should be ready for data input
+# One prompt on the terminal at a time; concurrent workers wait here instead of interleaving
+_terminal_lock = threading.Lock()
 
-Use browser_snapshot to analyze page accessibility tree and content.
-Return "READY" if sell page is ready, or describe what's missing/wrong.
-"""
+def _ask_user(lines: List[str], question: str) -> Optional[str]:
+    """
+    Print lines and read one answer from stdin; None if the user cancelled with 'q' or EOF (Ctrl-D).
+    Blocking, so run it in a thread; Ctrl-C only reaches the main thread and aborts the run instead.
+    """
+    with _terminal_lock:
+        for line in lines:
+            print(line)
+        try:
+            answer = input(question)
+        except EOFError:
+            return None
+    return None if answer.strip().lower() == 'q' else answer
+
+# How long to watch for the login dialog to close before asking the user to press Enter instead
+_LOGIN_WAIT_TIMEOUT = _env_number("GRAILED_LOGIN_TIMEOUT", 120.0)
+_LOGIN_POLL_INTERVAL = 0.5
+
+def _logged_in(probe: Optional[Dict[str, Any]]) -> bool:
+    """A probe positively showing a signed-in Grailed page: no login dialog, plus account UI or the sell form"""
+    if probe is None or probe.get("login"):
+        return False
+    return _is_grailed_url(str(probe.get("url", ""))) and bool(probe.get("account") or probe.get("dept"))
+
+def _wait_for_login(playwright_client, timeout: float) -> bool:
+    """
+    Watch the login dialog this tool was called for until the page shows the user signed in.
+    False, so the caller asks the user instead, when the dialog isn't on the page to begin with,
+    the page can't be probed, or no signed-in page appears before the timeout (dismissed dialog,
+    SSO redirect that doesn't come back, unrecognized layout).
+    """
+    probe = _probe_page(playwright_client)
+    if probe is None or not probe.get("login"):
+        return False
+    
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(_LOGIN_POLL_INTERVAL)
+        if _logged_in(_probe_page(playwright_client)):
+            return True
+    return False
+
+def _print_lines(lines: List[str]) -> None:
+    """Print lines as one block under the terminal lock; blocking, so run it in a thread"""
+    with _terminal_lock:
+        for line in lines:
+            print(line)
 
 @tool
-def prompt_user_login() -> str:
+async def prompt_user_login() -> str:
     """Prompt user to complete login manually when popup appears"""
-    print("\n" + "="*60)
-    print("🔐 LOGIN POPUP DETECTED")
-    print("="*60)
-    print("A login popup has appeared on the page.")
-    print("Please complete the following steps:")
-    print("1. Look at the browser window")
-    print("2. Complete the login process in the popup")
-    print("3. Wait for the popup to close and return to the main page")
-    print("4. Come back here and press Enter to continue")
-    print("="*60)
+    cache = _active_snapshot_cache.get()
+    # The terminal lock may be held by another worker's prompt, so wait for it off the event loop
+    await asyncio.to_thread(_print_lines, [
+        "\n" + "="*60,
+        "🔐 LOGIN POPUP DETECTED",
+        "="*60,
+        "A login popup has appeared on the page.",
+        "Please complete the login process in the browser window.",
+        "The agent continues automatically once you are signed in.",
+        "="*60
+    ])
     
-    try:
-        input("Press Enter after you have completed login in the popup...")
-        return "User confirmed login popup completed"
-    except KeyboardInterrupt:
-        return "User cancelled login process"
+    # Watching the page off the event loop lets other listing workers keep going meanwhile
+    verified = await asyncio.to_thread(_wait_for_login, cache.client, _LOGIN_WAIT_TIMEOUT)
+    if not verified:
+        answer = await asyncio.to_thread(_ask_user, [
+            "⏳ Could not confirm the login from the page.",
+            "Finish logging in, wait for the popup to close, then come back here."
+        ], "Press Enter after you have completed login in the popup (or 'q' to cancel)...")
+        if answer is None:
+            return "User cancelled login process"
+        verified = _logged_in(await asyncio.to_thread(_probe_page, cache.client))
+    
+    # The page changed under any cached snapshot
+    cache.invalidate()
+    if not verified:
+        return "User reported login completed, but the page does not show a signed-in session; check state again"
+    
+    # Later runs and concurrent workers reuse this session instead of prompting again
+    await asyncio.to_thread(_save_storage_state, cache.client)
+    return "User confirmed login popup completed"
 
 @tool 
-def prompt_user_confirmation(message: str) -> str:
+async def prompt_user_confirmation(message: str) -> str:
     """Prompt user for confirmation with a custom message"""
-    print(f"\n📋 {message}")
-    try:
-        response = input("Press Enter to continue or 'q' to quit: ").strip().lower()
-        if response == 'q':
-            return "User chose to quit"
-        return "User confirmed to continue"
-    except KeyboardInterrupt:
-        return "User cancelled"
+    response = await asyncio.to_thread(_ask_user, [f"\n📋 {message}"], "Press Enter to continue or 'q' to quit: ")
+    if response is None:
+        return "User chose to quit"
+    return "User confirmed to continue"
+
+@lru_cache(maxsize=64)
+def _wait_retry_prompt(action_description: str, max_retries: int) -> str:
+    """The agent retries the same few actions, so each distinct prompt is rendered once"""
+    return _WAIT_AND_RETRY_TEMPLATE.substitute(action_description=action_description, max_retries=max_retries)
 
 @tool
 def wait_and_retry(action_description: str, max_retries: int = 3) -> str:
@@ -279,86 +814,332 @@ def wait_and_retry(action_description: str, max_retries: int = 3) -> str:
     Helper tool for retrying actions with waits.
     Useful for handling dynamic page loading.
     """
-    return f"""
-RETRY STRATEGY for: {action_description}
+    return _wait_retry_prompt(action_description, max_retries)
+
+# Sell form controls for each metadata field, most specific selector first
+_FORM_FIELD_SELECTORS = {
+    "department": ['select[name="department"]'],
+    "category": ['select[name="category"]'],
+    "sub_category": ['select[name="sub_category"]', 'select[name="subcategory"]'],
+    "designer": ['input[name="designer"]'],
+    "item_name": ['input[name="title"]', 'input[name="name"]'],
+    "size": ['select[name="size"]', 'input[name="size"]'],
+    "color": ['input[name="color"]', 'select[name="color"]'],
+    "condition": ['select[name="condition"]'],
+    "price": ['input[name="price"]'],
+    "description": ['textarea[name="description"]']
+}
+
+# Sets every field in one page round trip; goes through the native value setter so
+# React-controlled inputs see the change, then fires input/change like typing would.
+# Selects take the option whose value or label matches case-insensitively; a field only
+# counts as filled if the element holds the value afterwards, else it is reported unmatched
+_FILL_FORM_SCRIPT = string.Template("""() => {
+  const report = {filled: [], missing: [], unmatched: []};
+  const norm = s => String(s).trim().toLowerCase();
+  for (const [field, selectors, value] of $fields) {
+    const el = selectors.map(s => document.querySelector(s)).find(Boolean);
+    if (!el) { report.missing.push(field); continue; }
+    let target = value;
+    if (el.tagName === 'SELECT') {
+      const option = [...el.options].find(o => o.value === value)
+        || [...el.options].find(o => norm(o.value) === norm(value) || norm(o.text) === norm(value));
+      if (!option) { report.unmatched.push(field); continue; }
+      target = option.value;
+    }
+    const setter = Object.getOwnPropertyDescriptor(Object.getPrototypeOf(el), 'value')?.set;
+    if (setter) { setter.call(el, target); } else { el.value = target; }
+    el.dispatchEvent(new Event('input', {bubbles: true}));
+    el.dispatchEvent(new Event('change', {bubbles: true}));
+    (el.value === target ? report.filled : report.unmatched).push(field);
+  }
+  return report;
+}""")
 
-1. Wait 2-3 seconds for page to stabilize
-2. Check current page state with detect_current_page_state()
-3. Take screenshot to see current state
-4. Attempt the action
-5. If action fails, wait another 2-3 seconds and retry
-6. Maximum {max_retries} retries before reporting failure
+@tool
+def fill_listing_form(metadata: Dict[str, Any]) -> str:
+    """
+    Fill all sell form fields for one listing in a single browser call.
+    Use this instead of typing/selecting each field separately.
+    """
+    fields = [
+        [field, selectors, str(metadata[field])]
+        for field, selectors in _FORM_FIELD_SELECTORS.items()
+        if field in metadata
+    ]
+    snapshot_cache = _active_snapshot_cache.get()
+    if snapshot_cache.client is None:
+        return "Error: Browser automation not available"
+    
+    # The form is about to change, so any cached snapshot of it is stale
+    snapshot_cache.invalidate()
+    try:
+        result = snapshot_cache.client.call_tool_sync("grailed-fill-form", "browser_evaluate", {
+            "function": _FILL_FORM_SCRIPT.substitute(fields=json.dumps(fields))
+        })
+    except Exception as e:
+        return f"Error filling form: {str(e)}"
+    
+    report = _content_text(result.get("content", []))
+    if result.get("status") != "success":
+        return f"Error filling form: {report}"
+    return (f"{report}\nFill any fields listed under missing or unmatched with browser_type/browser_select_option "
+            "(for unmatched selects, pick the closest option), then check the form with browser_snapshot.")
+
+# MCP server discovery: remember the winning command and cap how long probes may take
+_MCP_SERVER_CACHE = _CACHE_DIR / "mcp_server.json"
+_MCP_PROBE_TIMEOUT = _env_number("GRAILED_MCP_PROBE_TIMEOUT", 60.0)
+_MCP_WARM_START_TIMEOUT = _env_number("GRAILED_MCP_WARM_START_TIMEOUT", 15.0)
+_MCP_PREFERENCE_GRACE = _env_number("GRAILED_MCP_PREFERENCE_GRACE", 3.0)
+# Seconds between retries of the cached server before falling back to a full probe
+_MCP_RETRY_BACKOFF = (0.05, 0.1, 0.2, 0.4, 0.8, 1.5)
+# Browser binaries location when the user overrides it; otherwise servers use Playwright's
+# per-platform default, which is where setup_strands.py installs Chromium
+_PLAYWRIGHT_BROWSERS_PATH = os.getenv("PLAYWRIGHT_BROWSERS_PATH")
+
+def _mcp_environment() -> Dict[str, Any]:
+    """What a cached server command depends on: the platform and the installed npx"""
+    npx = shutil.which("npx")
+    try:
+        npx_mtime_ns = os.stat(npx).st_mtime_ns if npx else None
+    except OSError:
+        npx_mtime_ns = None
+    return {"platform": sys.platform, "npx": npx, "npx_mtime_ns": npx_mtime_ns}
 
-Use this pattern for:
-- Clicking buttons that trigger navigation
-- Waiting for form elements to appear
-- Handling dynamic content loading
-"""
+def _load_cached_mcp_server() -> Dict[str, Any]:
+    """
+    Return the MCP server recorded by the previous run ({"command", "tool_names", "environment", "timestamp"}),
+    or {} if there is none or it was recorded on another platform or npx install
+    """
+    try:
+        cached = json.loads(_MCP_SERVER_CACHE.read_text())
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cached, dict) or not isinstance(cached.get("command"), list):
+        return {}
+    return cached if cached.get("environment") == _mcp_environment() else {}
+
+def _save_cached_mcp_server(command: List[str], playwright_tools) -> None:
+    """Remember the working MCP server command and its tools so the next run tries it first"""
+    entry = {
+        "command": command,
+        "tool_names": sorted(t.tool_name for t in playwright_tools),
+        "environment": _mcp_environment(),
+        "timestamp": time.time()
+    }
+    try:
+        _MCP_SERVER_CACHE.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        _MCP_SERVER_CACHE.write_text(json.dumps(entry, indent=None))
+    except OSError:
+        pass
 
-def setup_playwright_client():
-    """Setup MCP Playwright client with Chrome browser and return the client and tools"""
+def _playwright_mcp_client(command: List[str]):
+    """MCPClient for a Playwright MCP server command; passes PLAYWRIGHT_BROWSERS_PATH through when it is set"""
+    from mcp import StdioServerParameters, stdio_client
+    from mcp.client.stdio import get_default_environment
+    from strands.tools.mcp import MCPClient
+    
+    # stdio servers only inherit a small allow-list of variables, so pass the browser cache explicitly
+    env = get_default_environment()
+    if _PLAYWRIGHT_BROWSERS_PATH:
+        env["PLAYWRIGHT_BROWSERS_PATH"] = _PLAYWRIGHT_BROWSERS_PATH
+    return MCPClient(lambda: stdio_client(
+        StdioServerParameters(
+            command=command[0],
+            args=command[1:] if len(command) > 1 else [],
+            env=env
+        )
+    ))
+
+def _npm_global_root() -> Optional[Path]:
+    """Directory of globally installed npm packages (`npm root -g`), or None if npm can't tell"""
+    try:
+        result = subprocess.run(["npm", "root", "-g"], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    root = result.stdout.strip()
+    return Path(root) if result.returncode == 0 and root else None
+
+def _npm_package_name(spec: str) -> str:
+    """Package name of an npx spec without its version: "@playwright/mcp@latest" -> "@playwright/mcp" """
+    # Skip the first character so a scope's leading "@" isn't taken for the version separator
+    return spec[0] + spec[1:].partition("@")[0]
+
+def _stop_unused_client(future) -> None:
+    """Done-callback for a probe whose client lost the race: shut its server down once it has started"""
+    if not future.cancelled() and future.exception() is None:
+        future.result()[0].stop(None, None, None)
+
+def setup_playwright_client(stack: ExitStack):
+    """
+    Setup MCP Playwright client with Chrome browser and return the client and tools.
+    The returned client is already started; stack owns it and stops it on exit.
+    """
+    # Check MCP for Playwright browser automation is installed; _playwright_mcp_client imports it
+    try:
+        mcp_available = all(importlib.util.find_spec(name) is not None for name in ("mcp", "strands.tools.mcp"))
+    except ImportError as e:
+        logger.error("Error importing MCP tools: %s", e)
+        return None, []
+    if not mcp_available:
+        logger.error("Error importing MCP tools: mcp is not installed")
+        return None, []
+    
     print("🤖 Setting up MCP Playwright client with Chrome browser...")
     
-    # Try different MCP server names with Chrome configuration
+    # Every candidate runs through npx; without it each probe would just fail after a process spawn
+    if shutil.which("npx") is None:
+        print("❌ npx not found - install Node.js from https://nodejs.org/ for browser automation")
+        return None, []
+    
+    # Candidate MCP servers in priority order: Chrome first, then default-browser fallbacks
     server_commands = [
-            ["npx", "@playwright/mcp@latest"]
+        ["npx", "@playwright/mcp@latest"],
+        ["npx", "@automatalabs/mcp-server-playwright"],
+        ["npx", "@modelcontextprotocol/server-playwright"]
     ]
     
-    for command in server_commands:
+    def probe(command):
+        playwright_client = _playwright_mcp_client(command)
+        
+        # Test the client connection, leaving the server running for the agent
+        playwright_client.start()
         try:
-            print(f"🔄 Trying MCP server with Chrome: {' '.join(command)}")
-            playwright_client = MCPClient(lambda: stdio_client(
-                StdioServerParameters(
-                    command=command[0],
-                    args=command[1:] if len(command) > 1 else []
-                )
-            ))
-            
-            # Test the client connection
-            with playwright_client:
-                playwright_tools = playwright_client.list_tools_sync()
-                print(f"✅ Loaded {len(playwright_tools)} Playwright tools via MCP (Chrome)")
-                return playwright_client, playwright_tools
-                
-        except Exception as e:
-            print(f"❌ Failed with {' '.join(command)}: {str(e)[:100]}...")
-            continue
+            playwright_tools = playwright_client.list_tools_sync()
+        except Exception:
+            playwright_client.stop(None, None, None)
+            raise
+        return playwright_client, playwright_tools
     
-    # Fallback to default browser if Chrome-specific commands fail
-    print("🔄 Falling back to default browser configuration...")
-    fallback_commands = [
-        ["npx", "@automatalabs/mcp-server-playwright"],
-        ["npx", "@modelcontextprotocol/server-playwright"]
-    ]
+    def keep(command, playwright_client, playwright_tools):
+        stack.callback(playwright_client.stop, None, None, None)
+        _save_cached_mcp_server(command, playwright_tools)
+        return playwright_client, playwright_tools
     
-    for command in fallback_commands:
+    # Warm start: the server that worked last run almost always still works, so try it alone first
+    cached_server = _load_cached_mcp_server()
+    cached_command = cached_server.get("command")
+    # A cached server still starting at the deadline keeps running and joins the probe race below
+    warm_future = None
+    if cached_command in server_commands:
+        logger.info("Trying cached MCP server: %s", " ".join(cached_command))
+        deadline = time.monotonic() + _MCP_WARM_START_TIMEOUT
+        executor = ThreadPoolExecutor(max_workers=1)
         try:
-            print(f"🔄 Trying fallback MCP server: {' '.join(command)}")
-            playwright_client = MCPClient(lambda: stdio_client(
-                StdioServerParameters(
-                    command=command[0],
-                    args=command[1:] if len(command) > 1 else []
-                )
-            ))
-            
-            # Test the client connection
-            with playwright_client:
-                playwright_tools = playwright_client.list_tools_sync()
-                print(f"✅ Loaded {len(playwright_tools)} Playwright tools via MCP (default browser)")
-                return playwright_client, playwright_tools
+            # A quick failure is often transient (npx cache lock, port race), so retry with backoff
+            for delay in _MCP_RETRY_BACKOFF + (None,):
+                future = executor.submit(probe, cached_command)
+                try:
+                    playwright_client, playwright_tools = future.result(timeout=max(0, deadline - time.monotonic()))
+                except FuturesTimeoutError:
+                    # Usually npx re-resolving @latest, not a broken server, so don't give up on it
+                    warm_future = future
+                    logger.info("Cached MCP server did not respond within %.0fs", _MCP_WARM_START_TIMEOUT)
+                    break
+                except Exception as e:
+                    logger.info("Failed with %s: %.100s", " ".join(cached_command), e)
+                    if delay is None or time.monotonic() + delay >= deadline:
+                        break
+                    time.sleep(delay)
+                    continue
                 
-        except Exception as e:
-            print(f"❌ Failed with {' '.join(command)}: {str(e)[:100]}...")
-            continue
+                if sorted(t.tool_name for t in playwright_tools) != cached_server.get("tool_names"):
+                    logger.info("MCP server tool list changed since last run")
+                print(f"✅ Loaded {len(playwright_tools)} Playwright tools via MCP ({' '.join(cached_command)}, cached)")
+                return keep(cached_command, playwright_client, playwright_tools)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if warm_future is None:
+            server_commands.remove(cached_command)
+    
+    # npx fetches "@latest" servers on demand; the unpinned fallbacks are only worth a probe when installed
+    npm_root = _npm_global_root()
+    if npm_root is not None:
+        server_commands = [
+            command for command in server_commands
+            if command[1].endswith("@latest") or (npm_root / _npm_package_name(command[1])).is_dir()
+            or (warm_future is not None and command == cached_command)
+        ]
+    if not server_commands:
+        print("⚠️  Warning: Could not load Playwright MCP tools")
+        print("   Browser automation will be limited. You can still use image analysis features.")
+        return None, []
+    
+    # Probe all candidates concurrently so a hanging npx start doesn't delay the others
+    logger.info("Probing %d MCP servers in parallel", len(server_commands))
+    executor = ThreadPoolExecutor(max_workers=len(server_commands))
+    futures = {
+        warm_future if warm_future is not None and command == cached_command else executor.submit(probe, command): rank
+        for rank, command in enumerate(server_commands)
+    }
+    not_done = set(futures)
+    results = {}
+    deadline = time.monotonic() + _MCP_PROBE_TIMEOUT
+    grace_started = False
+    try:
+        while not_done:
+            done, not_done = wait(not_done, timeout=deadline - time.monotonic(), return_when=FIRST_COMPLETED)
+            if not done:
+                if not results:
+                    logger.warning("MCP probe timed out after %.0fs", _MCP_PROBE_TIMEOUT)
+                break
+            for future in done:
+                rank = futures[future]
+                command = server_commands[rank]
+                try:
+                    results[rank] = future.result()
+                    logger.info("MCP server responded: %s", " ".join(command))
+                except Exception as e:
+                    logger.info("Failed with %s: %.100s", " ".join(command), e)
+            
+            # Stop once no higher-priority candidate is still running
+            pending_ranks = [futures[future] for future in not_done]
+            if results and min(results) < min(pending_ranks, default=len(server_commands)):
+                break
+            # With a working server in hand, give preferred ones only a short grace period to catch up
+            if results and not grace_started:
+                deadline = min(deadline, time.monotonic() + _MCP_PREFERENCE_GRACE)
+                grace_started = True
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    
+    # Every server but the winner gets shut down, including probes still starting up
+    winner = min(results, default=None)
+    for future, rank in futures.items():
+        if rank != winner:
+            future.add_done_callback(_stop_unused_client)
+    
+    if winner is not None:
+        playwright_client, playwright_tools = results[winner]
+        print(f"✅ Loaded {len(playwright_tools)} Playwright tools via MCP ({' '.join(server_commands[winner])})")
+        return keep(server_commands[winner], playwright_client, playwright_tools)
     
     print("⚠️  Warning: Could not load Playwright MCP tools")
     print("   Browser automation will be limited. You can still use image analysis features.")
     return None, []
 
+# Environment settings each provider's model is built from; a change to any of them builds a fresh model
+_MODEL_CONFIG_ENV = {
+    "anthropic": ("ANTHROPIC_API_KEY",),
+    "bedrock": ("AWS_PROFILE", "AWS_REGION"),
+    "gemini": ("GEMINI_API_KEY", "GEMINI_MODEL_ID", "GEMINI_MAX_TOKENS", "GEMINI_TEMPERATURE")
+}
+
 def setup_model():
-    """Setup the AI model (Bedrock, Anthropic, or Gemini)"""
+    """Setup the AI model (Bedrock, Anthropic, or Gemini), reusing it while the configuration is unchanged"""
     model_provider = os.getenv("AI_MODEL_PROVIDER", "anthropic")
-    
+    config = "\0".join(os.getenv(name) or "" for name in _MODEL_CONFIG_ENV.get(model_provider, ()))
+    return _build_model(model_provider, hashlib.sha1(config.encode()).hexdigest()[:8])
+
+@lru_cache(maxsize=4)
+def _boto_session(aws_profile: Optional[str], aws_region: str):
+    """One boto3 session per profile and region, so credentials are resolved once per process"""
+    import boto3
+    return boto3.Session(profile_name=aws_profile, region_name=aws_region)
+
+@lru_cache(maxsize=4)
+def _build_model(model_provider: str, config_digest: str):
+    """Construct the model client; config_digest only keys the cache"""
     if model_provider == "anthropic":
         try:
             from strands.models.anthropic import AnthropicModel
@@ -381,17 +1162,17 @@ def setup_model():
     elif model_provider == "bedrock":
         try:
             from strands.models.bedrock import BedrockModel
-            aws_profile = os.getenv("AWS_PROFILE", "default")
+            aws_profile = os.getenv("AWS_PROFILE")
             aws_region = os.getenv("AWS_REGION", "us-east-1")
             
+            # BedrockModel takes the profile through a session; an unset AWS_PROFILE uses the default chain
             model = BedrockModel(
+                boto_session=_boto_session(aws_profile, aws_region),
                 model_id="us.anthropic.claude-3-7-sonnet-20250219-v1:0",
-                region_name=aws_region,
-                profile_name=aws_profile,
                 max_tokens=8192,
                 params={"temperature": 0.1}
             )
-            print(f"✅ Using Bedrock Claude 3 Sonnet model (region: {aws_region}, profile: {aws_profile})")
+            print(f"✅ Using Bedrock Claude 3 Sonnet model (region: {aws_region}, profile: {aws_profile or 'default'})")
             return model
         except Exception as e:
             print(f"❌ Failed to setup Bedrock model: {e}")
@@ -410,8 +1191,8 @@ def setup_model():
                     "base_url": "https://generativelanguage.googleapis.com/v1beta/openai/"
                 },
                 model_id=os.getenv("GEMINI_MODEL_ID", "gemini-2.5-pro"),
-                max_tokens=int(os.getenv("GEMINI_MAX_TOKENS", "4000")),
-                params={"temperature": float(os.getenv("GEMINI_TEMPERATURE", "0.1"))}
+                max_tokens=_env_number("GEMINI_MAX_TOKENS", 4000, int),
+                params={"temperature": _env_number("GEMINI_TEMPERATURE", 0.1)}
             )
             model_name = os.getenv("GEMINI_MODEL_ID", "gemini-2.5-pro")
             print(f"✅ Using Google {model_name} model via OpenAI-compatible endpoint")
@@ -423,23 +1204,20 @@ def setup_model():
     else:
         raise ValueError(f"Unsupported AI_MODEL_PROVIDER: {model_provider}. Supported: anthropic, bedrock, gemini")
 
-def create_agent_with_mcp(playwright_client, playwright_tools, model):
-    """Create agent with MCP tools within the context manager"""
-    
-    # System prompt for the agent with STATE-AWARE automation
-    system_prompt = """You are a STATE-AWARE Grailed Listing Agent that ALWAYS checks what page you're on before taking actions.
+# System prompt for the agent with STATE-AWARE automation, built once at import
+_SYSTEM_PROMPT = """You are a STATE-AWARE Grailed Listing Agent that ALWAYS checks what page you're on before taking actions.
 
 ## CRITICAL STATE-AWARE WORKFLOW:
 
 ### ALWAYS START WITH STATE DETECTION:
 Before ANY action, use detect_current_page_state() to understand where you are in the browser.
+If navigate_to_sell_page returns ALREADY_ON_SELL_PAGE, skip Phase 1 and 2 and go directly to form filling.
 
 ### Phase 1: Initial Navigation with State Tracking
 1. Load listings data from JSON file
 2. Use browser_navigate to go to https://www.grailed.com
 3. **IMMEDIATELY**: Use detect_current_page_state() to confirm page loaded
-4. Take screenshot for visual confirmation
-5. Wait for page to fully stabilize
+4. Use browser_wait_for on text you expect (e.g. "Sell") instead of fixed sleeps
 
 ### Phase 2: State-Aware Navigation to Sell Page
 1. **Check Current State**: Use detect_current_page_state()
@@ -459,7 +1237,8 @@ Before ANY action, use detect_current_page_state() to understand where you are i
 2. **If NOT READY**: Use navigate_to_sell_page() to get to correct state
 3. **If READY**: Proceed with form filling for each item:
    - Use prompt_user_confirmation() for each item
-   - Fill department, category, designer, etc.
+   - Call fill_listing_form(metadata) ONCE per item instead of filling fields one by one;
+     only fields it reports as missing or unmatched need browser_type/browser_select_option
    - Upload images
    - Set price and options
    - Review and submit (or simulate in dry-run)
@@ -476,22 +1255,24 @@ Before ANY action, use detect_current_page_state() to understand where you are i
 2. **VERIFY BEFORE ACTION**: Use verify_sell_page_ready() before form filling
 3. **CHECK AFTER NAVIGATION**: Always verify you ended up where expected
 4. **HANDLE LOGIN PROPERLY**: Only use prompt_user_login() when popup actually detected
-5. **VISUAL CONFIRMATION**: Take screenshots frequently for debugging
+5. **SCREENSHOTS ONLY FOR ERRORS**: Take a screenshot only when an action failed and the state is unclear
 6. **WAIT FOR STABILITY**: Use wait_and_retry() for dynamic content
 
 ## STATE DETECTION PRIORITIES:
-1. Use browser_snapshot to check current page content and URL
+1. Use browser_snapshot to check current page content and URL (cached until the page changes; pass force=true to re-read after a click)
+   - Snapshots are trimmed to the most important elements; pass full_snapshot=true only if something you need is missing
+   - Re-reads of the same page may come back as a JSON diff (unchanged/added/removed/modified) against the last snapshot you saw
 2. Look for page-specific elements (sell button, form fields, login modals)
 3. Check page title and navigation elements
-4. Take screenshot for visual confirmation
-5. Report current state clearly before proceeding
+4. Report current state clearly before proceeding
 
 ## Available Tools:
 - **State Tools**: detect_current_page_state, navigate_to_sell_page, verify_sell_page_ready
-- **Browser Tools**: browser_navigate, browser_snapshot, browser_click, browser_type, browser_select_option
+- **Form Tools**: fill_listing_form (every metadata field in one call)
+- **Browser Tools**: browser_navigate, browser_snapshot, browser_click, browser_type, browser_select_option, browser_wait_for
 - **User Interaction**: prompt_user_login
-- **Utility Tools**: wait_and_retry, expand_image_paths, validate_grailed_metadata
-- **Data Tools**: file_read, file_write, gemini_image_reader
+- **Utility Tools**: wait_and_retry, expand_image_paths, validate_grailed_metadata, validate_grailed_metadata_bulk (one call for all listings)
+- **Data Tools**: file_read, file_write, gemini_images_reader (all of a listing's images at once), gemini_image_reader
 
 ## SUCCESS CRITERIA:
 - Always know what page you're on
@@ -503,58 +1284,49 @@ Before ANY action, use detect_current_page_state() to understand where you are i
 Remember: STATE AWARENESS is the key to reliable browser automation!
 """
 
+def _system_prompt_content():
+    """
+    The system prompt, with a cache point after it for providers that support prompt caching,
+    so every agent step (and every command in a multi-command run) reuses the cached prefix
+    """
+    if os.getenv("AI_MODEL_PROVIDER", "anthropic") in ("anthropic", "bedrock"):
+        return [{"text": _SYSTEM_PROMPT}, {"cachePoint": {"type": "default"}}]
+    return _SYSTEM_PROMPT
+
+def create_agent_with_mcp(playwright_client, playwright_tools, model, snapshot_cache: SnapshotCache = None):
+    """Create agent with MCP tools within the context manager"""
+    from strands import Agent
+    from strands_tools import file_read, file_write
+    
+    # Serve repeated browser_snapshot calls from cache until a page-changing tool runs
+    snapshot_cache = snapshot_cache or _snapshot_cache
+    snapshot_cache.attach(playwright_client)
+    playwright_tools = [SnapshotCachingTool(t, snapshot_cache) for t in playwright_tools]
+    
     # Combine all tools
     all_tools = [
-        file_read, file_write, gemini_image_reader,
-        expand_image_paths, validate_grailed_metadata,
-        detect_current_page_state, navigate_to_sell_page, verify_sell_page_ready,
+        file_read, file_write, gemini_images_reader, gemini_image_reader,
+        expand_image_paths, validate_grailed_metadata, validate_grailed_metadata_bulk,
+        detect_current_page_state, navigate_to_sell_page, verify_sell_page_ready, fill_listing_form,
         prompt_user_login, wait_and_retry
     ] + playwright_tools
     
-    # Create the agent
+    # Create the agent; output is printed by _stream_command, so no callback handler
     agent = Agent(
         model=model,
         tools=all_tools,
-        system_prompt=system_prompt
+        system_prompt=_system_prompt_content(),
+        callback_handler=None
     )
     
     return agent
 
-def run_with_mcp_context(command: str, filename: str, dry_run: bool = False):
-    """Run the agent within the MCP context manager"""
-    print("🤖 Initializing STATE-AWARE Grailed Listing Agent...")
-    
-    # Setup model
-    model = setup_model()
-    
-    # Setup MCP Playwright client
-    playwright_client, playwright_tools = setup_playwright_client()
-    
-    if playwright_client is None:
-        print("⚠️  Running without browser automation capabilities")
-        return "Browser automation not available"
-    
-    # Run within MCP context manager
-    with playwright_client:
-        print("✅ MCP Playwright client context active")
-        
-        # Create agent with MCP tools
-        agent = create_agent_with_mcp(playwright_client, playwright_tools, model)
-        
-        # Run the command with specific instructions
-        if command == "validate":
-            print("✅ Validating listings file...")
-            response = agent(f"Please validate the listings file: {filename}")
-        elif command == "analyze":
-            print("🔍 Analyzing images and generating metadata...")
-            response = agent(f"Please analyze images and generate metadata for: {filename}")
-        elif command == "run":
-            mode = "DRY RUN" if dry_run else "LIVE"
-            print(f"🚀 Creating Grailed listings in {mode} mode with STATE AWARENESS...")
-            
-            # Specific instructions for STATE-AWARE browser automation
-            instructions = f"""
-Create Grailed listings from {filename} in {'dry-run' if dry_run else 'live'} mode using STATE-AWARE automation.
+# Per-command agent instructions, filled in with str.format_map at call time
+_COMMAND_PROMPTS = {
+    "analyze": "Please analyze images and generate metadata for: {filename}",
+    # Specific instructions for STATE-AWARE browser automation
+    "run": """
+Create Grailed listings from {filename} in {mode} mode using STATE-AWARE automation.
 
 IMPORTANT: This is a FULLY AUTOMATED workflow. Process ALL listings without requesting user confirmation for each item.
 
@@ -582,7 +1354,7 @@ CRITICAL STATE-AWARE WORKFLOW:
 5. **Process Each Item with State Awareness (FULLY AUTOMATED)**:
    - For each item in listings:
      - Verify still on sell page before filling forms
-     - Fill all form fields with metadata automatically
+     - Fill all form fields with one fill_listing_form call per item
      - Upload images using the provided image paths
      - Submit or simulate in dry-run mode
      - Check state after each major action
@@ -594,34 +1366,312 @@ CRITICAL STATE-AWARE WORKFLOW:
    - Use wait_and_retry() for actions that need time
    - Always verify state before retrying
 
+REMEMBER: Never assume page state - always check first!
+""",
+    # One listing per agent when GRAILED_CONCURRENCY > 1; each worker drives its own browser
+    "run_listing": """
+Create this single Grailed listing (item {index} of {filename}) in {mode} mode using STATE-AWARE automation.
+Do not read the listings file; the item is:
+
+{listing}
+
+IMPORTANT: This is a FULLY AUTOMATED workflow. Do not request user confirmation.
+
+1. Navigate to https://www.grailed.com and use detect_current_page_state() to confirm the page loaded
+2. Reach the sell page (handle any login popup) and use verify_sell_page_ready() before filling the form
+3. Expand and upload the item's images, fill all form fields with one fill_listing_form call, then submit or simulate in dry-run mode
+4. If any action fails, use detect_current_page_state() to diagnose and wait_and_retry() for actions that need time
+
 REMEMBER: Never assume page state - always check first!
 """
+}
+
+@lru_cache(maxsize=16)
+def _command_prompt(command: str, filename: str, dry_run: bool) -> str:
+    """Render the instructions for a command once per (command, filename, mode)"""
+    return _COMMAND_PROMPTS[command].format_map({
+        "filename": filename,
+        "mode": "dry-run" if dry_run else "live"
+    })
+
+_UTF8_BOM = b"\xef\xbb\xbf"
+
+def _load_listings(filename: str) -> List[Any]:
+    """Parse the listings file; raises ValueError if it is not a JSON list"""
+    data = Path(filename).expanduser().read_bytes()
+    if data.startswith(_UTF8_BOM):
+        # Editors on Windows often save one; neither orjson nor ijson accept it
+        data = data[len(_UTF8_BOM):]
+    listings = orjson.loads(data) if orjson is not None else json.loads(data)
+    if not isinstance(listings, list):
+        raise ValueError("Listings file must contain a list of items")
+    return listings
+
+def _json_array_start(f) -> Optional[int]:
+    """Offset of the '[' opening a JSON array, past a UTF-8 BOM and any whitespace; None if the file holds something else"""
+    offset = len(_UTF8_BOM) if f.read(len(_UTF8_BOM)) == _UTF8_BOM else 0
+    f.seek(offset)
+    while True:
+        chunk = f.read(4096)
+        if not chunk:
+            return None
+        head = chunk.lstrip(b" \t\r\n")
+        if head:
+            return offset + len(chunk) - len(head) if head.startswith(b"[") else None
+        offset += len(chunk)
+
+def stream_listings(filename: str) -> Iterator[Any]:
+    """Yield listings one at a time; parses incrementally with ijson, else loads the whole file"""
+    if ijson is None:
+        yield from _load_listings(filename)
+        return
+    with open(Path(filename).expanduser(), 'rb') as f:
+        start = _json_array_start(f)
+        if start is None:
+            raise ValueError("Listings file must contain a list of items")
+        f.seek(start)
+        try:
+            yield from ijson.items(f, 'item', use_float=True)
+        except ijson.JSONError as e:
+            raise ValueError(str(e).strip().splitlines()[0]) from e
+
+def _prevalidate_listings(listings: Iterable[Any]) -> List[str]:
+    """Errors that would make the agent fail on an item (not an object, non-JPG images); missing fields only warn"""
+    errors = []
+    for index, item in enumerate(listings):
+        if not isinstance(item, dict):
+            errors.append(f"Item {index}: expected an object, got {type(item).__name__}")
+            continue
+        try:
+            validate_grailed_metadata(item)
+        except ValueError as e:
+            errors.append(f"Item {index}: {e}")
+    return errors
+
+# Listings submitted at once by `run`; above 1 each worker gets its own browser and agent
+_CONCURRENCY = max(1, _env_number("GRAILED_CONCURRENCY", 1, int))
+
+def _worker_server_command() -> Optional[List[str]]:
+    """MCP server command for a concurrent worker, based on the server setup_playwright_client picked"""
+    command = _load_cached_mcp_server().get("command")
+    if not command:
+        return None
+    # @playwright/mcp shares one persistent browser profile between instances unless isolated;
+    # isolated browsers start from the session saved after the last manual login
+    if command[1].startswith("@playwright/mcp"):
+        command = command + ["--isolated"]
+        if _STORAGE_STATE.is_file():
+            command.append(f"--storage-state={_STORAGE_STATE}")
+    return command
+
+async def run_listings_concurrently(filename: str, dry_run: bool, model, concurrency: int,
+                                    playwright_client, playwright_tools) -> str:
+    """
+    Submit each listing from its own agent and browser, at most `concurrency` at a time.
+    The already-running playwright_client is the first worker; the rest get isolated servers.
+    """
+    listings = _load_listings(filename)
+    command = _worker_server_command()
+    if command is None:
+        raise RuntimeError("No working MCP Playwright server found")
+    
+    mode = "dry-run" if dry_run else "live"
+    worker_count = min(concurrency, len(listings))
+    print(f"🚀 Submitting {len(listings)} listings with {worker_count} browser workers...")
+    
+    with ExitStack() as stack:
+        clients = [_playwright_mcp_client(command) for _ in range(worker_count - 1)]
+        for client in clients:
+            stack.callback(client.stop, None, None, None)
+        await asyncio.gather(*(asyncio.to_thread(client.start) for client in clients))
+        
+        # Idle workers wait in the queue, which also caps how many listings run at once
+        workers = asyncio.Queue()
+        for client, tools in [(playwright_client, playwright_tools)] + [(c, c.list_tools_sync()) for c in clients]:
+            snapshot_cache = SnapshotCache()
+            agent = create_agent_with_mcp(client, tools, model, snapshot_cache)
+            workers.put_nowait((agent, snapshot_cache))
+        
+        async def submit_listing(index: int, item: Dict[str, Any]):
+            agent, snapshot_cache = await workers.get()
+            try:
+                _active_snapshot_cache.set(snapshot_cache)
+                return await agent.invoke_async(_COMMAND_PROMPTS["run_listing"].format_map({
+                    "index": index,
+                    "filename": filename,
+                    "mode": mode,
+                    "listing": json.dumps(item, indent=2)
+                }))
+            finally:
+                print(f"🏁 Listing {index} finished")
+                workers.put_nowait((agent, snapshot_cache))
+        
+        results = await asyncio.gather(
+            *(submit_listing(i, item) for i, item in enumerate(listings)),
+            return_exceptions=True
+        )
+    
+    return "\n".join(
+        f"❌ Listing {i}: {result}" if isinstance(result, Exception) else f"✅ Listing {i}: {result}"
+        for i, result in enumerate(results)
+    )
+
+def _print_event(event: Dict[str, Any]) -> None:
+    """Print model text as it streams in, plus a line for each tool the agent calls"""
+    if event.get("data"):
+        print(event["data"], end="", flush=True)
+    tool_use = event.get("event", {}).get("contentBlockStart", {}).get("start", {}).get("toolUse")
+    if tool_use:
+        print(f"\n🔧 {tool_use['name']}", flush=True)
+
+async def _stream_command(agent, prompt: str):
+    """Run one agent turn, printing events as they arrive; returns the final AgentResult"""
+    result = None
+    async for event in agent.stream_async(prompt):
+        _print_event(event)
+        if "result" in event:
+            result = event["result"]
+    print()
+    return result
+
+def run_with_mcp_context(commands: List[str], filename: str, dry_run: bool = False) -> List[tuple]:
+    """Run each command in turn with one model, MCP server and agent; returns (command, response) pairs"""
+    print("🤖 Initializing STATE-AWARE Grailed Listing Agent...")
+    
+    # Setup model
+    model = setup_model()
+    
+    # The MCP Playwright server started during discovery stays up for the agent; the stack stops it
+    with ExitStack() as stack:
+        playwright_client, playwright_tools = setup_playwright_client(stack)
+        
+        if playwright_client is None:
+            print("⚠️  Running without browser automation capabilities")
+            return [(command, "Browser automation not available") for command in commands]
+        
+        print("✅ MCP Playwright client context active")
+        
+        agent = None
+        responses = []
+        for command in commands:
+            if command == "run" and _CONCURRENCY > 1:
+                responses.append((command, asyncio.run(run_listings_concurrently(
+                    filename, dry_run, model, _CONCURRENCY, playwright_client, playwright_tools
+                ))))
+                continue
+            
+            # Create agent with MCP tools once; later commands reuse it and its conversation
+            if agent is None:
+                agent = create_agent_with_mcp(playwright_client, playwright_tools, model)
             
-            response = agent(instructions)
+            # Run the command with specific instructions
+            if command == "analyze":
+                print("🔍 Analyzing images and generating metadata...")
+            elif command == "run":
+                mode = "DRY RUN" if dry_run else "LIVE"
+                print(f"🚀 Creating Grailed listings in {mode} mode with STATE AWARENESS...")
+            
+            # Stream progress instead of staying silent until the whole command finishes
+            try:
+                responses.append((command, asyncio.run(_stream_command(agent, _command_prompt(command, filename, dry_run)))))
+            except KeyboardInterrupt:
+                print(f"\n⏹️  {command} aborted by user")
+                responses.append((command, "Aborted by user"))
+                break
+        return responses
+
+def _validate_only(filename: str) -> bool:
+    """The validate command: check every listing locally, no model or browser needed; True if none has errors"""
+    print(f"✅ Validating listings in {filename}...")
+    
+    errors = 0
+    total = 0
+    for index, item in enumerate(stream_listings(filename)):
+        total += 1
+        if not isinstance(item, dict):
+            errors += 1
+            print(f"❌ Item {index}: expected an object, got {type(item).__name__}")
+            continue
         
-        return response
+        label = f"Item {index} ({item['item_name']})" if "item_name" in item else f"Item {index}"
+        # Same checks as validate_grailed_metadata, without its warning log repeating the line printed here
+        try:
+            image_paths = _image_paths_of(item)
+        except ValueError as e:
+            errors += 1
+            print(f"❌ {label}: {e}")
+            continue
+        missing, bad_suffix = _metadata_verdict(frozenset(item.keys() & _KNOWN_METADATA_FIELDS), image_paths)
+        if bad_suffix is not None:
+            errors += 1
+            print(f"❌ {label}: Invalid image format: {bad_suffix}. Only JPG/JPEG files are supported.")
+            continue
+        
+        if missing:
+            print(f"⚠️  {label}: missing {', '.join(missing)}")
+        else:
+            print(f"✅ {label}")
+    
+    print(f"{'✅' if errors == 0 else '❌'} {total - errors}/{total} listings valid")
+    return errors == 0
 
 def main():
     """Main entry point"""
     if len(sys.argv) < 3:
-        print("Usage: python grailed_agent_state_aware.py <command> <filename> [--dry-run]")
-        print("Commands: validate, analyze, run")
+        print("Usage: python grailed_agent.py <command>[,<command>...] <filename> [--dry-run] [--verbose]")
+        print("Commands: validate, analyze, run (e.g. validate,analyze,run shares one browser and agent)")
         sys.exit(1)
     
-    command = sys.argv[1]
+    commands = sys.argv[1].split(",")
     filename = sys.argv[2]
     dry_run = "--dry-run" in sys.argv
+    _configure_logging(verbose="--verbose" in sys.argv)
     
-    if command not in ["validate", "analyze", "run"]:
+    if not commands or any(command not in ["validate", "analyze", "run"] for command in commands):
         print("❌ Invalid command. Use: validate, analyze, or run")
         sys.exit(1)
     
+    # Fail fast on a mistyped path before paying for model and MCP server setup
+    if not Path(filename).expanduser().is_file():
+        print(f"❌ Listings file not found: {filename}")
+        sys.exit(1)
+    
+    if "validate" in commands:
+        try:
+            valid = _validate_only(filename)
+        except ValueError as e:
+            print(f"❌ Invalid listings file: {e}")
+            sys.exit(1)
+        if not valid:
+            sys.exit(1)
+    agent_commands = [command for command in commands if command != "validate"]
+    if not agent_commands:
+        sys.exit(0)
+    
+    if _STRANDS_IMPORT_ERROR is not None:
+        print(f"❌ Error importing Strands Agents SDK: {_STRANDS_IMPORT_ERROR}")
+        print("Please install: pip install strands-agents strands-agents-tools")
+        sys.exit(1)
+    
+    # Reject listings the agent would fail on, also before any model or browser setup
+    if "validate" not in commands:
+        try:
+            errors = _prevalidate_listings(stream_listings(filename))
+        except ValueError as e:
+            print(f"❌ Invalid listings file: {e}")
+            sys.exit(1)
+        if errors:
+            print("❌ Listings failed validation:")
+            for error in errors:
+                print(f"   - {error}")
+            sys.exit(1)
+    
     try:
-        response = run_with_mcp_context(command, filename, dry_run)
-        print("=" * 60)
-        print("AGENT RESPONSE:")
-        print("=" * 60)
-        print(response)
+        for command, response in run_with_mcp_context(agent_commands, filename, dry_run):
+            print("=" * 60)
+            print(f"AGENT RESPONSE ({command}):")
+            print("=" * 60)
+            print(response)
     except Exception as e:
         print(f"❌ Error: {e}")
         sys.exit(1)
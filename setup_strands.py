@@ -3,6 +3,7 @@
 Setup script for Grailed Listing Agent using Strands Agents SDK
 """
 
+import json
 import os
 import subprocess
 import sys
@@ -50,26 +51,62 @@ def check_node_js():
         print("   Please install Node.js from https://nodejs.org/")
         return False
 
-def setup_playwright_mcp():
+PLAYWRIGHT_MCP_PACKAGE = "@modelcontextprotocol/server-playwright"
+
+def installed_npm_globals():
+    """Names of globally installed npm packages (empty if npm can't be queried)."""
+    try:
+        result = subprocess.run(["npm", "ls", "-g", "--depth=0", "--json"], capture_output=True, text=True)
+        return set(json.loads(result.stdout or "{}").get("dependencies", {}))
+    except (OSError, ValueError):
+        return set()
+
+def playwright_browsers_path():
+    """Where Playwright keeps downloaded browsers on this platform."""
+    if os.getenv("PLAYWRIGHT_BROWSERS_PATH"):
+        return Path(os.environ["PLAYWRIGHT_BROWSERS_PATH"]).expanduser()
+    if sys.platform == "darwin":
+        return Path.home() / "Library" / "Caches" / "ms-playwright"
+    if sys.platform == "win32":
+        return Path(os.getenv("LOCALAPPDATA", Path.home() / "AppData" / "Local")) / "ms-playwright"
+    return Path.home() / ".cache" / "ms-playwright"
+
+def chromium_installed():
+    """Check whether Playwright has already downloaded a Chromium build."""
+    browsers = playwright_browsers_path()
+    return browsers.is_dir() and any(browsers.glob("chromium-*"))
+
+def setup_playwright_mcp(install_browsers=True):
     """Setup Playwright MCP server for browser automation."""
     print("\n🎭 Setting up Playwright MCP server...")
     
     try:
-        # Install Playwright MCP server globally
-        result = subprocess.run([
-            "npm", "install", "-g", "@modelcontextprotocol/server-playwright"
-        ], capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            print("✅ Playwright MCP server installed")
+        # Install Playwright MCP server globally, unless a previous setup already did
+        # (installs only keep stderr; npm's stdout log can run to megabytes)
+        if PLAYWRIGHT_MCP_PACKAGE in installed_npm_globals():
+            print("✅ Playwright MCP server already installed")
         else:
-            print(f"❌ Failed to install Playwright MCP server: {result.stderr}")
-            return False
+            result = subprocess.run([
+                "npm", "install", "-g", PLAYWRIGHT_MCP_PACKAGE
+            ], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+            
+            if result.returncode == 0:
+                print("✅ Playwright MCP server installed")
+            else:
+                print(f"❌ Failed to install Playwright MCP server: {result.stderr}")
+                return False
+        
+        if not install_browsers:
+            print("⏭️  Skipping Playwright browser install (--no-install-browsers)")
+            return True
+        if chromium_installed():
+            print("✅ Playwright browsers already installed")
+            return True
         
         # Install Playwright browsers
         result = subprocess.run([
             "npx", "playwright", "install", "chromium"
-        ], capture_output=True, text=True)
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
         
         if result.returncode == 0:
             print("✅ Playwright browsers installed")
@@ -187,6 +224,7 @@ def main():
     print("="*60)
     
     success = True
+    install_browsers = "--no-install-browsers" not in sys.argv
     
     # Check Python version
     if not check_python_version():
@@ -196,15 +234,16 @@ def main():
     if success and not install_strands_agents():
         success = False
     
-    # Check Node.js for MCP
-    if success and not check_node_js():
-        print("⚠️  Node.js not found - browser automation will not work")
-        print("   Install Node.js from https://nodejs.org/ to enable browser features")
-        success = False
-    
-    # Setup Playwright MCP
-    if success and not setup_playwright_mcp():
-        print("⚠️  Playwright MCP setup failed - browser automation may not work")
+    # Check Node.js for MCP; the npm/npx installs need it
+    if success:
+        if not check_node_js():
+            print("⚠️  Node.js not found - browser automation will not work")
+            print("   Install Node.js from https://nodejs.org/ to enable browser features")
+            success = False
+        
+        # Setup Playwright MCP
+        elif not setup_playwright_mcp(install_browsers):
+            print("⚠️  Playwright MCP setup failed - browser automation may not work")
     
     # Create configuration files
     create_env_file()
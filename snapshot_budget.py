@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Token-budget compaction for Playwright MCP accessibility snapshots
+Keeps the interactive elements the agent needs and drops the long tail of layout nodes
+"""
+
+import json
+import re
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+# ARIA role priorities: form controls and buttons first, layout containers last
+ROLE_SCORES = {
+    "button": 100,
+    "textbox": 95,
+    "combobox": 95,
+    "listbox": 95,
+    "checkbox": 90,
+    "radio": 90,
+    "option": 85,
+    "link": 80,
+    "dialog": 75,
+    "alert": 75,
+    "heading": 60,
+}
+DEFAULT_ROLE_SCORE = 10
+
+DEFAULT_MAX_ELEMENTS = 300
+DEFAULT_MAX_TOKENS = 8000
+
+# Same-page snapshots that changed less than this fraction of elements are sent as a diff
+DIFF_THRESHOLD = 0.7
+
+_ELEMENT_LINE = re.compile(r'^\s*- (/?[\w-]+)(?: "((?:[^"\\]|\\.)*)")?(.*?):?\s*$')
+_REF = re.compile(r'\[ref=([^\]]+)\]')
+_PAGE_URL = re.compile(r'^- Page URL: (\S+)', re.MULTILINE)
+_YAML_FENCE = "```yaml"
+
+
+def score_element(role: str) -> int:
+    """Priority of an accessibility node by its ARIA role"""
+    return ROLE_SCORES.get(role, DEFAULT_ROLE_SCORE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)"""
+    return len(text) // 4
+
+
+def page_url(snapshot_text: str) -> Optional[str]:
+    """Extract the 'Page URL' line from a Playwright MCP snapshot"""
+    match = _PAGE_URL.search(snapshot_text)
+    return match.group(1) if match else None
+
+
+def breadcrumb(urls: Iterable[str]) -> str:
+    """Summarize navigation history as e.g. 'Home → Sell'"""
+    labels = []
+    for url in urls:
+        segments = [s for s in urlparse(url).path.split("/") if s]
+        label = segments[0].replace("-", " ").title() if segments else "Home"
+        if not labels or labels[-1] != label:
+            labels.append(label)
+    return " → ".join(labels)
+
+
+def split_snapshot(snapshot_text: str):
+    """Split snapshot text into (header, yaml tree, trailer); tree is None if there is no snapshot block"""
+    start = snapshot_text.find(_YAML_FENCE)
+    if start < 0:
+        return snapshot_text, None, ""
+    body_start = start + len(_YAML_FENCE)
+    end = snapshot_text.find("```", body_start)
+    if end < 0:
+        end = len(snapshot_text)
+    return snapshot_text[:start], snapshot_text[body_start:end].strip("\n"), snapshot_text[end + 3:]
+
+
+def parse_elements(tree: str) -> List[Dict[str, str]]:
+    """
+    Flatten a snapshot yaml tree to one dict per node: role, name, ref and the compact line.
+    Property lines such as '- /url: /sell' are folded into their parent node.
+    """
+    elements = []
+    for raw in tree.splitlines():
+        match = _ELEMENT_LINE.match(raw)
+        if not match:
+            continue
+        role, name, rest = match.group(1), match.group(2) or "", match.group(3)
+        if role.startswith("/"):
+            if elements:
+                elements[-1]["line"] += f" {role[1:]}{rest}"
+            continue
+        ref = _REF.search(rest)
+        elements.append({
+            "role": role,
+            "name": name,
+            "ref": ref.group(1) if ref else "",
+            "line": raw.strip().rstrip(":")
+        })
+    return elements
+
+
+def select_elements(elements: List[Dict[str, str]], reserved_tokens: int = 0,
+                    max_elements: int = DEFAULT_MAX_ELEMENTS,
+                    max_tokens: int = DEFAULT_MAX_TOKENS) -> List[int]:
+    """
+    Indices, in document order, of the elements compact_snapshot keeps: the top
+    max_elements by role score, added in priority order while they fit in max_tokens
+    minus reserved_tokens (the page header and trailer).
+    """
+    ranked = sorted(range(len(elements)), key=lambda i: -score_element(elements[i]["role"]))[:max_elements]
+
+    budget = max_tokens - reserved_tokens
+    kept = []
+    for index in ranked:
+        cost = estimate_tokens(elements[index]["line"]) + 1
+        if cost > budget:
+            break
+        budget -= cost
+        kept.append(index)
+    return sorted(kept)
+
+
+def compact_snapshot(snapshot_text: str, history: Iterable[str] = (),
+                     max_elements: int = DEFAULT_MAX_ELEMENTS,
+                     max_tokens: int = DEFAULT_MAX_TOKENS) -> str:
+    """
+    Reduce a snapshot to its highest-priority elements within a token budget.
+
+    Elements are ranked by role score, the top max_elements are kept, and lines are
+    added in priority order until max_tokens is reached. Kept elements are emitted in
+    document order under the original page header and a navigation breadcrumb.
+    """
+    header, tree, trailer = split_snapshot(snapshot_text)
+    if tree is None:
+        return snapshot_text
+
+    elements = parse_elements(tree)
+    kept = select_elements(elements, estimate_tokens(header) + estimate_tokens(trailer), max_elements, max_tokens)
+
+    lines = []
+    trail = breadcrumb(history)
+    if trail:
+        lines.append(f"- Navigation: {trail}")
+    lines.append(f"- Showing {len(kept)} of {len(elements)} elements (priority-ranked, token budget {max_tokens})")
+    lines.append(_YAML_FENCE)
+    lines.extend(elements[i]["line"] for i in kept)
+    lines.append("```")
+    return header.rstrip("\n") + "\n" + "\n".join(lines) + trailer
+
+
+def fingerprint(elements: List[Dict[str, str]]) -> set:
+    """
+    Each node as (role, name, ref, line), for comparing two snapshots; the line carries
+    the value and state (e.g. ': "120"', '[checked]'), so filling a field counts as a change
+    """
+    return {(e["role"], e["name"], e["ref"], e["line"]) for e in elements}
+
+
+def diff_elements(previous: List[Dict[str, str]], elements: List[Dict[str, str]],
+                  threshold: float = DIFF_THRESHOLD) -> Optional[Dict[str, list]]:
+    """
+    Describe how a snapshot changed relative to the previous one of the same page.
+
+    Returns None when the symmetric-difference ratio of the two fingerprints reaches
+    threshold (the page changed too much for a diff to help). Otherwise returns refs
+    that are unchanged or removed, and full lines for added or modified elements.
+    An element with the same ref is modified when its line differs in any way,
+    including a new value or state.
+    """
+    before, after = fingerprint(previous), fingerprint(elements)
+    union = before | after
+    if not union or len(before ^ after) / len(union) >= threshold:
+        return None
+
+    previous_by_ref = {e["ref"]: e for e in previous if e["ref"]}
+    current_refs = {e["ref"] for e in elements if e["ref"]}
+    diff = {"unchanged": [], "added": [], "removed": [], "modified": []}
+    for e in elements:
+        old = previous_by_ref.get(e["ref"]) if e["ref"] else None
+        if old is None:
+            if (e["role"], e["name"], e["ref"], e["line"]) not in before:
+                diff["added"].append(e["line"])
+        elif old["line"] == e["line"]:
+            diff["unchanged"].append(e["ref"])
+        else:
+            diff["modified"].append(e["line"])
+    for e in previous:
+        if e["ref"] and e["ref"] not in current_refs:
+            diff["removed"].append(e["ref"])
+        elif not e["ref"] and (e["role"], e["name"], e["ref"], e["line"]) not in after:
+            diff["removed"].append(e["line"])
+    return diff
+
+
+def render_diff(snapshot_text: str, diff: Dict[str, list]) -> str:
+    """Replace the yaml tree of a snapshot with a JSON diff, keeping the page header"""
+    header, _, trailer = split_snapshot(snapshot_text)
+    return (header.rstrip("\n") + "\n- Changes since the previous snapshot of this page:\n```json\n"
+            + json.dumps(diff, separators=(",", ":")) + "\n```" + trailer)
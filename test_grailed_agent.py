@@ -6,10 +6,27 @@ This version demonstrates the structure without requiring API keys
 
 import json
 import logging
+import mmap
 import os
 import sys
+from collections import Counter
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, Iterator, List, Any, Optional, Set, Tuple
+
+# orjson parses listings files several times faster; stdlib json is the fallback
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# ijson parses a listings array one item at a time, so large files are never fully in memory
+try:
+    import ijson
+    IJSON_ERRORS = (ijson.JSONError,)
+except ImportError:
+    ijson = None
+    IJSON_ERRORS = ()
 
 # Configure logging
 logging.basicConfig(
@@ -27,6 +44,282 @@ except ImportError as e:
     sys.exit(1)
 
 
+# Listing schema, fixed for the life of the process
+REQUIRED_FIELDS = ("image_paths", "price")
+METADATA_FIELDS = (
+    "department", "category", "sub_category", "designer",
+    "item_name", "size", "color", "condition", "description"
+)
+
+
+def build_item_checker():
+    """
+    Generate a straight-line checker for the schema above.
+    
+    The returned function takes an item and returns (errors, missing_metadata), with
+    one explicit check per field instead of loops over the field lists.
+    """
+    lines = ["def check_item(item):", "    errors = []", "    missing = []", "    get = item.get"]
+    for field in REQUIRED_FIELDS:
+        lines.append(f"    if {field!r} not in item: errors.append({f'Missing required field: {field}'!r})")
+    for field in METADATA_FIELDS:
+        lines.append(f"    if get({field!r}) is None: missing.append({field!r})")
+    lines.append("    return errors, missing")
+    
+    namespace = {}
+    exec("\n".join(lines), namespace)
+    return namespace["check_item"]
+
+
+check_item = build_item_checker()
+
+
+# Listings files at least this large are memory-mapped for orjson instead of read into a copy
+MMAP_THRESHOLD = 64 * 1024 * 1024
+
+
+UTF8_BOM = b"\xef\xbb\xbf"
+
+
+def json_array_start(f: Any) -> Optional[int]:
+    """Offset of the '[' opening a JSON array, past a UTF-8 BOM and any whitespace; None otherwise."""
+    offset = len(UTF8_BOM) if f.read(len(UTF8_BOM)) == UTF8_BOM else 0
+    f.seek(offset)
+    while True:
+        chunk = f.read(4096)
+        if not chunk:
+            return None
+        head = chunk.lstrip(b" \t\r\n")
+        if head:
+            return offset + len(chunk) - len(head) if head.startswith(b"[") else None
+        offset += len(chunk)
+
+
+def load_listings_json(file_path: str) -> Any:
+    """Parse a listings file with orjson when available, else stdlib json."""
+    with open(file_path, 'rb') as f:
+        if orjson is not None and os.fstat(f.fileno()).st_size >= MMAP_THRESHOLD:
+            # orjson parses straight from the mapped pages through the buffer protocol
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+                skip = len(UTF8_BOM) if view[:len(UTF8_BOM)] == UTF8_BOM else 0
+                return orjson.loads(view[skip:])
+        data = f.read()
+    if data.startswith(UTF8_BOM):
+        data = data[len(UTF8_BOM):]
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers catch one type
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+# Parsed items of small listings files, keyed by absolute path and stamped with
+# (mtime_ns, size) so an edited file is parsed again; large files always stream
+PARSE_CACHE_MAX_BYTES = 8 * 1024 * 1024
+_parse_cache: Dict[str, Tuple[int, int, List[Any]]] = {}
+
+
+def iter_listings(file_path: str) -> Iterator[Any]:
+    """Yield the items of a listings file, from the parse cache when the file is unchanged."""
+    st = os.stat(file_path)
+    key = os.path.abspath(file_path)
+    cached = _parse_cache.get(key)
+    if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+        yield from cached[2]
+        return
+    if st.st_size > PARSE_CACHE_MAX_BYTES:
+        yield from parse_listings(file_path)
+        return
+    
+    items = list(parse_listings(file_path))
+    if len(_parse_cache) >= 8:
+        _parse_cache.clear()
+    _parse_cache[key] = (st.st_mtime_ns, st.st_size, items)
+    yield from items
+
+
+def parse_listings(file_path: str) -> Iterator[Any]:
+    """
+    Yield the items of a listings file one at a time.
+    
+    .jsonl files hold one item per line; .json files hold a list of items, parsed
+    incrementally with ijson when available. Raises ValueError for a non-list file.
+    """
+    loads = orjson.loads if orjson is not None else json.loads
+    if file_path.endswith(".jsonl"):
+        with open(file_path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    yield loads(line)
+        return
+    
+    if ijson is None:
+        data = load_listings_json(file_path)
+        if not isinstance(data, list):
+            raise ValueError("JSON file must contain a list of items")
+        yield from data
+        return
+    
+    with open(file_path, 'rb') as f:
+        start = json_array_start(f)
+        if start is None:
+            raise ValueError("JSON file must contain a list of items")
+        f.seek(start)
+        yield from ijson.items(f, 'item', use_float=True)
+
+
+@lru_cache(maxsize=8192)
+def expand_path(path: str) -> str:
+    """os.path.expanduser, memoized: listings repeat paths and HOME doesn't change mid-run."""
+    return os.path.expanduser(path)
+
+
+def list_directory(parent: str) -> Optional[Set[str]]:
+    """Names in a directory, or None if it can't be listed."""
+    try:
+        return set(os.listdir(parent))
+    except OSError:
+        return None
+
+
+def check_listing(index: int, item: Dict[str, Any], dir_index: Dict[str, Optional[Set[str]]]) -> Dict[str, Any]:
+    """
+    Validate one listing item.
+    
+    Args:
+        index: Position of the item in the file
+        item: The listing item
+        dir_index: Names in each image directory (None if it is missing), shared across items
+        
+    Returns:
+        The item's validation result
+    """
+    item_result = {
+        "index": index,
+        "valid": True,
+        "errors": [],
+        "warnings": [],
+        "missing_metadata": []
+    }
+    
+    # Check required fields and missing metadata in one generated pass
+    item_result["errors"], item_result["missing_metadata"] = check_item(item)
+    if item_result["errors"]:
+        item_result["valid"] = False
+    
+    # Check image paths
+    if "image_paths" in item:
+        for img_path in item["image_paths"]:
+            expanded_path = expand_path(img_path)
+            parent, name = os.path.split(expanded_path)
+            parent = parent or "."
+            if parent not in dir_index:
+                dir_index[parent] = list_directory(parent)
+            names = dir_index[parent]
+            # Re-check misses directly: case-insensitive filesystems match names the listing doesn't
+            found = names is not None and (name in names or os.access(expanded_path, os.F_OK))
+            if not found:
+                item_result["warnings"].append(f"Image file not found: {img_path}")
+    
+    return item_result
+
+
+def iter_item_results(file_path: str) -> Iterator[Dict[str, Any]]:
+    """Yield check_listing results in file order."""
+    # Names in each image directory, listed once per run so every image in a folder
+    # is checked by set membership instead of its own stat
+    dir_index: Dict[str, Optional[Set[str]]] = {}
+    
+    for index, item in enumerate(iter_listings(file_path)):
+        yield check_listing(index, item, dir_index)
+
+
+def scan_listings(file_path: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Validate and analyze a listings file in one parse and one pass over its items.
+    
+    Args:
+        file_path: Path to the listings.json file
+        
+    Returns:
+        (validation results, requirements analysis); raises on unreadable files
+    """
+    # Keep running totals for both reports as item results come in
+    validation_results = []
+    total_errors = 0
+    total_warnings = 0
+    items_ready = 0
+    missing_counts = Counter()
+    for item_result in iter_item_results(file_path):
+        validation_results.append(item_result)
+        total_errors += len(item_result["errors"])
+        total_warnings += len(item_result["warnings"])
+        
+        if item_result["missing_metadata"]:
+            missing_counts.update(item_result["missing_metadata"])
+        else:
+            items_ready += 1
+    
+    total_items = len(validation_results)
+    
+    # Overall validation: an item is invalid exactly when it has errors
+    validation = {
+        "valid": total_errors == 0,
+        "total_items": total_items,
+        "total_errors": total_errors,
+        "total_warnings": total_warnings,
+        "items": validation_results
+    }
+    
+    analysis = {
+        "total_items": total_items,
+        "items_needing_metadata": total_items - items_ready,
+        "items_ready": items_ready,
+        "common_missing_fields": dict(missing_counts),
+        "recommendations": []
+    }
+    
+    # Generate recommendations
+    if analysis["items_needing_metadata"] > 0:
+        analysis["recommendations"].append(
+            f"Run image analysis on {analysis['items_needing_metadata']} items to generate missing metadata"
+        )
+    
+    if analysis["items_ready"] > 0:
+        analysis["recommendations"].append(
+            f"{analysis['items_ready']} items are ready for listing creation"
+        )
+    
+    most_missing = missing_counts.most_common(1)[0] if missing_counts else None
+    if most_missing:
+        analysis["recommendations"].append(
+            f"Most commonly missing field: {most_missing[0]} (missing in {most_missing[1]} items)"
+        )
+    
+    return validation, analysis
+
+
+def scan_listings_safely(file_path: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """scan_listings, with failures reported in each result the way the tools return them."""
+    # Check if file exists
+    if not Path(file_path).exists():
+        error = f"File not found: {file_path}"
+        return {"valid": False, "error": error, "items": []}, {"error": f"Analysis failed: {error}"}
+    
+    try:
+        return scan_listings(file_path)
+    except json.JSONDecodeError as e:
+        error = f"Invalid JSON: {str(e)}"
+    except IJSON_ERRORS as e:
+        # ijson messages end with a multi-line pointer at the failure; keep the first line
+        error = f"Invalid JSON: {str(e).strip().splitlines()[0]}"
+    except ValueError as e:
+        error = str(e)
+    except Exception as e:
+        return (
+            {"valid": False, "error": f"Validation error: {str(e)}", "items": []},
+            {"error": f"Analysis failed: {str(e)}"}
+        )
+    return {"valid": False, "error": error, "items": []}, {"error": f"Analysis failed: {error}"}
+
+
 @tool
 def validate_listings_file(file_path: str) -> Dict[str, Any]:
     """
@@ -38,87 +331,7 @@ def validate_listings_file(file_path: str) -> Dict[str, Any]:
     Returns:
         Dictionary with validation results
     """
-    try:
-        # Check if file exists
-        if not Path(file_path).exists():
-            return {
-                "valid": False,
-                "error": f"File not found: {file_path}",
-                "items": []
-            }
-        
-        # Load and parse JSON
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-        
-        if not isinstance(data, list):
-            return {
-                "valid": False,
-                "error": "JSON file must contain a list of items",
-                "items": []
-            }
-        
-        # Validate each item
-        validation_results = []
-        for i, item in enumerate(data):
-            item_result = {
-                "index": i,
-                "valid": True,
-                "errors": [],
-                "warnings": [],
-                "missing_metadata": []
-            }
-            
-            # Check required fields
-            required_fields = ["image_paths", "price"]
-            for field in required_fields:
-                if field not in item:
-                    item_result["errors"].append(f"Missing required field: {field}")
-                    item_result["valid"] = False
-            
-            # Check image paths
-            if "image_paths" in item:
-                for img_path in item["image_paths"]:
-                    expanded_path = os.path.expanduser(img_path)
-                    if not Path(expanded_path).exists():
-                        item_result["warnings"].append(f"Image file not found: {img_path}")
-            
-            # Check for missing metadata
-            metadata_fields = [
-                "department", "category", "sub_category", "designer",
-                "item_name", "size", "color", "condition", "description"
-            ]
-            for field in metadata_fields:
-                if field not in item or item[field] is None:
-                    item_result["missing_metadata"].append(field)
-            
-            validation_results.append(item_result)
-        
-        # Overall validation
-        all_valid = all(item["valid"] for item in validation_results)
-        total_errors = sum(len(item["errors"]) for item in validation_results)
-        total_warnings = sum(len(item["warnings"]) for item in validation_results)
-        
-        return {
-            "valid": all_valid,
-            "total_items": len(data),
-            "total_errors": total_errors,
-            "total_warnings": total_warnings,
-            "items": validation_results
-        }
-        
-    except json.JSONDecodeError as e:
-        return {
-            "valid": False,
-            "error": f"Invalid JSON: {str(e)}",
-            "items": []
-        }
-    except Exception as e:
-        return {
-            "valid": False,
-            "error": f"Validation error: {str(e)}",
-            "items": []
-        }
+    return scan_listings_safely(file_path)[0]
 
 
 @tool
@@ -132,58 +345,22 @@ def analyze_listing_requirements(file_path: str) -> Dict[str, Any]:
     Returns:
         Analysis of listing requirements
     """
-    try:
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-        
-        analysis = {
-            "total_items": len(data),
-            "items_needing_metadata": 0,
-            "items_ready": 0,
-            "common_missing_fields": {},
-            "recommendations": []
-        }
-        
-        metadata_fields = [
-            "department", "category", "sub_category", "designer",
-            "item_name", "size", "color", "condition", "description"
-        ]
-        
-        for item in data:
-            missing_fields = []
-            for field in metadata_fields:
-                if field not in item or item[field] is None:
-                    missing_fields.append(field)
-                    analysis["common_missing_fields"][field] = analysis["common_missing_fields"].get(field, 0) + 1
-            
-            if missing_fields:
-                analysis["items_needing_metadata"] += 1
-            else:
-                analysis["items_ready"] += 1
-        
-        # Generate recommendations
-        if analysis["items_needing_metadata"] > 0:
-            analysis["recommendations"].append(
-                f"Run image analysis on {analysis['items_needing_metadata']} items to generate missing metadata"
-            )
-        
-        if analysis["items_ready"] > 0:
-            analysis["recommendations"].append(
-                f"{analysis['items_ready']} items are ready for listing creation"
-            )
-        
-        most_missing = max(analysis["common_missing_fields"].items(), key=lambda x: x[1]) if analysis["common_missing_fields"] else None
-        if most_missing:
-            analysis["recommendations"].append(
-                f"Most commonly missing field: {most_missing[0]} (missing in {most_missing[1]} items)"
-            )
-        
-        return analysis
+    return scan_listings_safely(file_path)[1]
+
+
+@tool
+def validate_and_analyze(file_path: str) -> Dict[str, Any]:
+    """
+    Validate a Grailed listings file and analyze what's needed, reading it once.
+    
+    Args:
+        file_path: Path to the listings.json file
         
-    except Exception as e:
-        return {
-            "error": f"Analysis failed: {str(e)}"
-        }
+    Returns:
+        Dictionary with "validation" and "analysis" results
+    """
+    validation, analysis = scan_listings_safely(file_path)
+    return {"validation": validation, "analysis": analysis}
 
 
 def create_test_agent() -> Agent:
@@ -204,30 +381,38 @@ Be helpful and provide actionable recommendations for improving their listings."
     # Create agent with basic tools (no API key required for this demo)
     agent = Agent(
         model="us.anthropic.claude-3-5-sonnet-20241022-v2:0",  # This will fail gracefully
-        tools=[file_read, file_write, validate_listings_file, analyze_listing_requirements],
+        tools=[file_read, file_write, validate_listings_file, analyze_listing_requirements, validate_and_analyze],
         system_prompt=system_prompt
     )
     
     return agent
 
 
+def print_json(result: Any) -> None:
+    """Print a tool result as indented JSON, encoded by orjson straight to stdout when available."""
+    if orjson is None:
+        print(json.dumps(result, indent=2))
+        return
+    sys.stdout.flush()
+    sys.stdout.buffer.write(orjson.dumps(result, option=orjson.OPT_INDENT_2))
+    sys.stdout.buffer.write(b"\n")
+    sys.stdout.buffer.flush()
+
+
 def main():
     """Main function for testing."""
     
     print("🧪 Testing Grailed Listing Agent Structure")
     print("="*50)
     
-    # Test the validation tool directly
-    print("\n📋 Testing validation tool...")
-    result = validate_listings_file("listings.json")
-    
-    print(f"Validation result: {result}")
-    
-    # Test the analysis tool
-    print("\n📊 Testing analysis tool...")
-    analysis = analyze_listing_requirements("listings.json")
+    # Test the validation and analysis tools directly; one call reads the file once for both
+    print("\n📋 Testing validation and analysis tools...")
+    combined = validate_and_analyze("listings.json")
     
-    print(f"Analysis result: {analysis}")
+    print("Validation result:")
+    print_json(combined["validation"])
+    print("\n📊 Analysis result:")
+    print_json(combined["analysis"])
     
     print("\n✅ Strands Agent structure is working!")
     print("\nTo use with real API:")
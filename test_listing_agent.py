@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Tests for grailed_agent helpers that run without a model or browser: listing parsing and
+validation, page classification, MCP server discovery and the concurrent listing queue
+Run with: python -m pytest test_listing_agent.py
+"""
+
+import asyncio
+import io
+import json
+import threading
+import time
+from contextlib import ExitStack
+from decimal import Decimal
+
+import pytest
+
+import grailed_agent
+
+
+def call(tool, *args):
+    """Run a @tool function's body directly, whether or not Strands wrapped it"""
+    return getattr(tool, "_tool_func", tool)(*args)
+
+
+def write_listings(tmp_path, data: bytes, name: str = "listings.json") -> str:
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+COMPLETE_ITEM = {
+    "department": "menswear", "category": "tops", "sub_category": "t-shirts", "designer": "Acne",
+    "item_name": "Tee", "size": "M", "color": "black", "condition": "gently_used", "price": 80,
+    "description": "Worn twice", "image_paths": ["~/photos/tee_1.jpg", "~/photos/tee_2.JPEG"]
+}
+
+
+# Listing files
+
+@pytest.mark.parametrize("data, start", [
+    (b'[{"a": 1}]', 0),
+    (b'\xef\xbb\xbf[1]', 3),
+    (b" \n\t" * 3000 + b"[1]", 9000),
+    (b'\xef\xbb\xbf  \r\n[1]', 7),
+])
+def test_json_array_start_skips_bom_and_any_whitespace(data, start):
+    assert grailed_agent._json_array_start(io.BytesIO(data)) == start
+
+
+@pytest.mark.parametrize("data", [b'{"a": [1]}', b"   ", b"", b"\xef\xbb\xbf"])
+def test_json_array_start_rejects_non_arrays(data):
+    assert grailed_agent._json_array_start(io.BytesIO(data)) is None
+
+
+def test_stream_listings_reads_bom_prefixed_file(tmp_path):
+    path = write_listings(tmp_path, b'\xef\xbb\xbf\n  [{"item_name": "a"}, {"item_name": "b"}]')
+
+    assert [item["item_name"] for item in grailed_agent.stream_listings(path)] == ["a", "b"]
+    assert len(grailed_agent._load_listings(path)) == 2
+
+
+def test_stream_listings_rejects_object_and_malformed_files(tmp_path):
+    with pytest.raises(ValueError, match="list of items"):
+        list(grailed_agent.stream_listings(write_listings(tmp_path, b'{"item_name": "a"}')))
+    with pytest.raises(ValueError):
+        list(grailed_agent.stream_listings(write_listings(tmp_path, b'[{"item_name": }]', "bad.json")))
+
+
+# Metadata validation
+
+@pytest.mark.parametrize("image_paths", [None, "a.jpg", [["a.jpg"]], ["a.jpg", 3], {"a": "b"}])
+def test_validate_rejects_malformed_image_paths(image_paths):
+    with pytest.raises(ValueError, match="image_paths must be a list"):
+        call(grailed_agent.validate_grailed_metadata, {"item_name": "x", "image_paths": image_paths})
+
+
+def test_validate_rejects_non_jpg_images():
+    with pytest.raises(ValueError, match=r"Invalid image format: \.png"):
+        call(grailed_agent.validate_grailed_metadata, {**COMPLETE_ITEM, "image_paths": ["a.jpg", "b.png"]})
+
+
+def test_validate_drops_unknown_fields_and_warns_about_missing_ones(caplog):
+    metadata = {"item_name": "Tee", "image_paths": ["a.jpg"], "notes": "internal"}
+
+    validated = call(grailed_agent.validate_grailed_metadata, metadata)
+
+    assert validated == {"item_name": "Tee", "image_paths": ["a.jpg"]}
+    assert "Missing required fields: department" in caplog.text
+
+
+def test_validate_disk_cache_hit_returns_same_values_as_miss(tmp_path, monkeypatch):
+    monkeypatch.setenv("GRAILED_AGENT_CACHE", "1")
+    monkeypatch.setattr(grailed_agent, "_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(grailed_agent, "_disk_cache_conn", None)
+    metadata = {**COMPLETE_ITEM, "price": Decimal("80.50")}
+
+    first = call(grailed_agent.validate_grailed_metadata, metadata)
+    second = call(grailed_agent.validate_grailed_metadata, metadata)
+
+    assert first == second == metadata
+    assert isinstance(second["price"], Decimal)
+    grailed_agent._disk_cache_conn.close()
+
+
+def test_validate_bulk_reports_bad_items_and_continues():
+    results = call(grailed_agent.validate_grailed_metadata_bulk, [
+        3, {**COMPLETE_ITEM, "image_paths": None}, COMPLETE_ITEM, {"item_name": "x", "image_paths": ["a.gif"]}
+    ])
+
+    assert results[0] == {"index": 0, "valid": False, "error": "item must be an object"}
+    assert results[1]["valid"] is False and "image_paths" in results[1]["error"]
+    assert results[2]["valid"] is True and results[2]["missing_fields"] == []
+    assert results[3]["valid"] is False and ".gif" in results[3]["error"]
+
+
+def test_validate_only_reports_each_problem_once(tmp_path, capsys, caplog):
+    listings = [COMPLETE_ITEM, {"item_name": "Cap", "image_paths": ["cap.jpg"]},
+                {"item_name": "Bag", "image_paths": None}, {"image_paths": [["a.jpg"]]}, 7]
+    path = write_listings(tmp_path, json.dumps(listings).encode())
+
+    valid = grailed_agent._validate_only(path)
+
+    out = capsys.readouterr().out
+    assert valid is False
+    assert "✅ Item 0 (Tee)" in out
+    assert out.count("Item 1 (Cap): missing department") == 1
+    assert "❌ Item 2 (Bag): image_paths must be a list of file paths" in out
+    assert "❌ Item 3: image_paths must be a list of file paths" in out
+    assert "❌ Item 4: expected an object, got int" in out
+    assert "2/5 listings valid" in out
+    assert "Missing required fields" not in caplog.text
+
+
+def test_prevalidate_listings_collects_errors_instead_of_raising():
+    errors = grailed_agent._prevalidate_listings([COMPLETE_ITEM, "x", {"image_paths": [1]}])
+
+    assert errors == ["Item 1: expected an object, got str", "Item 2: image_paths must be a list of file paths"]
+
+
+def test_expand_image_paths_rechecks_scandir_misses(tmp_path, monkeypatch, caplog):
+    for name in ("IMG_1.JPG", "IMG_2.JPG", "IMG_3.JPG"):
+        (tmp_path / name).write_bytes(b"\xff\xd8")
+    real_isfile = grailed_agent.os.path.isfile
+    # A case-insensitive filesystem: any spelling of an existing name is a file
+    monkeypatch.setattr(grailed_agent.os.path, "isfile", lambda p: real_isfile(p) or real_isfile(p.replace("img_1.jpg", "IMG_1.JPG")))
+    paths = [str(tmp_path / "img_1.jpg"), str(tmp_path / "IMG_2.JPG"), str(tmp_path / "IMG_3.JPG"), str(tmp_path / "gone.jpg")]
+
+    call(grailed_agent.expand_image_paths, paths)
+
+    assert "img_1.jpg" not in caplog.text
+    assert "Image file not found: " + paths[3] in caplog.text
+
+
+def test_image_readers_return_image_blocks(tmp_path):
+    photo = tmp_path / "tee.jpg"
+    photo.write_bytes(b"\xff\xd8\xff")
+
+    single = call(grailed_agent.gemini_image_reader, str(photo))
+    batch = call(grailed_agent.gemini_images_reader, [str(photo), str(tmp_path / "gone.jpg")])
+
+    assert single == {"status": "success", "content": [{"image": {"format": "jpeg", "source": {"bytes": b"\xff\xd8\xff"}}}]}
+    assert [list(block) for block in batch["content"]] == [["text"], ["image"], ["text"]]
+    assert batch["content"][2]["text"].startswith("Error: Image file not found")
+    assert call(grailed_agent.gemini_image_reader, str(tmp_path / "gone.jpg"))["status"] == "error"
+
+
+def test_env_number_falls_back_on_malformed_values(monkeypatch, caplog):
+    monkeypatch.setenv("GRAILED_TEST_NUMBER", "four")
+
+    assert grailed_agent._env_number("GRAILED_TEST_NUMBER", 1, int) == 1
+    assert "Ignoring GRAILED_TEST_NUMBER='four'" in caplog.text
+    monkeypatch.setenv("GRAILED_TEST_NUMBER", "2.5")
+    assert grailed_agent._env_number("GRAILED_TEST_NUMBER", 1.0) == 2.5
+    monkeypatch.delenv("GRAILED_TEST_NUMBER")
+    assert grailed_agent._env_number("GRAILED_TEST_NUMBER", 15.0) == 15.0
+
+
+# Page classification
+
+@pytest.mark.parametrize("path, state", [
+    ("", "homepage"), ("/", "homepage"), ("/sell", "sell_page"), ("/sell/new", "sell_page"),
+    ("/sellers/acne", None), ("/selling", None), ("/users/123", "profile"), ("/profile", "profile"),
+    ("/profiles", None), ("/listings/1", None),
+])
+def test_classify_path(path, state):
+    assert grailed_agent._classify_path(path) == state
+
+
+@pytest.mark.parametrize("url, trusted", [
+    ("https://www.grailed.com/sell", True), ("https://grailed.com/", True),
+    ("https://evilgrailed.com/sell", False), ("https://grailed.com.example.net/", False), ("", False),
+])
+def test_is_grailed_url(url, trusted):
+    assert grailed_agent._is_grailed_url(url) is trusted
+
+
+def test_classify_probe():
+    sell = {"url": "https://www.grailed.com/sell/new", "dept": True}
+
+    assert grailed_agent._classify_probe(sell) == "sell_page"
+    assert grailed_agent._classify_probe({**sell, "login": True}) == "login_popup"
+    assert grailed_agent._classify_probe({**sell, "dept": False, "overlay": True}) is None
+    assert grailed_agent._classify_probe({"url": "https://www.grailed.com/"}) == "homepage"
+    assert grailed_agent._classify_probe({**sell, "url": "https://evilgrailed.com/sell"}) is None
+
+
+def test_known_page_state_from_snapshot():
+    def snapshot(tree, url="https://www.grailed.com/"):
+        return [{"text": f"- Page URL: {url}\n- Page Snapshot:\n```yaml\n{tree}\n```\n"}]
+
+    assert grailed_agent._known_page_state(snapshot('- link "Sell" [ref=e1]')) == "homepage"
+    assert grailed_agent._known_page_state(snapshot('- dialog "Log in" [ref=e1]:\n  - textbox "Email" [ref=e2]')) == "login_popup"
+    assert grailed_agent._known_page_state(snapshot('- dialog "Cookies" [ref=e1]')) is None
+    assert grailed_agent._known_page_state(snapshot('- link "Sell" [ref=e1]', "https://evilgrailed.com/")) is None
+
+
+def test_logged_in_needs_grailed_host_and_account_signal():
+    assert grailed_agent._logged_in({"url": "https://www.grailed.com/", "account": True})
+    assert not grailed_agent._logged_in({"url": "https://www.grailed.com/", "account": True, "login": True})
+    assert not grailed_agent._logged_in({"url": "https://www.grailed.com/"})
+    assert not grailed_agent._logged_in({"url": "https://evilgrailed.com/", "account": True})
+    assert not grailed_agent._logged_in(None)
+
+
+def test_snapshot_diff_names_only_elements_the_model_was_shown():
+    tree = "\n".join(f'- generic "g{i}" [ref=g{i}]' for i in range(300)) + '\n- textbox "Price" [ref=p1]'
+    snapshot = f"### Page state\n- Page URL: https://www.grailed.com/sell\n- Page Snapshot:\n```yaml\n{tree}\n```\n"
+    cache = grailed_agent.SnapshotCache()
+
+    cache.render([{"text": snapshot}], max_tokens=200)
+    rendered = cache.render([{"text": snapshot.replace("[ref=p1]", '[ref=p1]: "120"')}], max_tokens=200)[0]["text"]
+
+    diff = json.loads(rendered.split("```json\n", 1)[1].split("\n```", 1)[0])
+    assert diff["modified"] == ['- textbox "Price" [ref=p1]: "120"']
+    assert "g299" not in diff["unchanged"]
+
+
+# MCP server discovery
+
+class FakeTool:
+    tool_name = "browser_snapshot"
+
+
+class FakeClient:
+    """Stands in for MCPClient; behaviour per package name: a start delay in seconds or an exception"""
+    behaviours = {}
+    starts = []
+
+    def __init__(self, command):
+        self.command = command
+        self.stopped = False
+
+    def start(self):
+        FakeClient.starts.append(self.command[1])
+        behaviour = FakeClient.behaviours.get(self.command[1], 0)
+        if isinstance(behaviour, Exception):
+            raise behaviour
+        time.sleep(behaviour)
+
+    def list_tools_sync(self):
+        return [FakeTool()]
+
+    def stop(self, *exc_info):
+        self.stopped = True
+
+
+@pytest.fixture
+def discovery(tmp_path, monkeypatch):
+    """setup_playwright_client with fake servers, a fake npm root and an in-memory server cache"""
+    FakeClient.behaviours = {}
+    FakeClient.starts = []
+    saved = {}
+    monkeypatch.setattr(grailed_agent.shutil, "which", lambda name: "/usr/bin/" + name)
+    monkeypatch.setattr(grailed_agent, "_playwright_mcp_client", FakeClient)
+    monkeypatch.setattr(grailed_agent, "_npm_global_root", lambda: tmp_path)
+    monkeypatch.setattr(grailed_agent, "_load_cached_mcp_server", lambda: dict(saved))
+    monkeypatch.setattr(grailed_agent, "_save_cached_mcp_server", lambda command, tools: saved.update(command=command))
+    monkeypatch.setattr(grailed_agent, "_MCP_RETRY_BACKOFF", ())
+    monkeypatch.setattr(grailed_agent, "_MCP_WARM_START_TIMEOUT", 0.2)
+    monkeypatch.setattr(grailed_agent, "_MCP_PREFERENCE_GRACE", 0.2)
+    return saved
+
+
+def test_discovery_uses_first_responding_server_and_caches_it(discovery):
+    with ExitStack() as stack:
+        client, tools = grailed_agent.setup_playwright_client(stack)
+
+    assert client.command == ["npx", "@playwright/mcp@latest"]
+    assert client.stopped
+    assert discovery["command"] == ["npx", "@playwright/mcp@latest"]
+
+
+def test_discovery_keeps_slow_cached_server_in_the_race(discovery):
+    discovery["command"] = ["npx", "@playwright/mcp@latest"]
+    FakeClient.behaviours["@playwright/mcp@latest"] = 0.5
+
+    with ExitStack() as stack:
+        client, _ = grailed_agent.setup_playwright_client(stack)
+
+    assert client.command == ["npx", "@playwright/mcp@latest"]
+    assert FakeClient.starts == ["@playwright/mcp@latest"]
+
+
+def test_discovery_falls_back_to_installed_server(discovery, tmp_path):
+    (tmp_path / "@automatalabs" / "mcp-server-playwright").mkdir(parents=True)
+    discovery["command"] = ["npx", "@playwright/mcp@latest"]
+    FakeClient.behaviours["@playwright/mcp@latest"] = RuntimeError("npx failed")
+
+    with ExitStack() as stack:
+        client, _ = grailed_agent.setup_playwright_client(stack)
+
+    assert client.command == ["npx", "@automatalabs/mcp-server-playwright"]
+    assert "@modelcontextprotocol/server-playwright" not in FakeClient.starts
+
+
+def test_discovery_without_npx(discovery, monkeypatch, capsys):
+    monkeypatch.setattr(grailed_agent.shutil, "which", lambda name: None)
+
+    with ExitStack() as stack:
+        assert grailed_agent.setup_playwright_client(stack) == (None, [])
+    assert "npx not found" in capsys.readouterr().out
+    assert FakeClient.starts == []
+
+
+# Concurrent listing queue
+
+def test_run_listings_concurrently_caps_workers_and_reports_each_listing(tmp_path, monkeypatch):
+    listings = [{"item_name": f"item {i}"} for i in range(6)]
+    path = write_listings(tmp_path, json.dumps(listings).encode())
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    class FakeAgent:
+        async def invoke_async(self, prompt):
+            with lock:
+                running.append(self)
+                peak.append(len(running))
+            await asyncio.sleep(0.01)
+            with lock:
+                running.remove(self)
+            if '"item 3"' in prompt:
+                raise RuntimeError("form rejected")
+            return "listed"
+
+    monkeypatch.setattr(grailed_agent, "_load_cached_mcp_server", lambda: {"command": ["npx", "@playwright/mcp@latest"]})
+    monkeypatch.setattr(grailed_agent, "_playwright_mcp_client", FakeClient)
+    monkeypatch.setattr(grailed_agent, "create_agent_with_mcp", lambda *args: FakeAgent())
+
+    report = asyncio.run(grailed_agent.run_listings_concurrently(path, True, None, 3, FakeClient(["npx", "x"]), []))
+
+    assert max(peak) <= 3
+    assert report.splitlines()[3] == "❌ Listing 3: form rejected"
+    assert report.count("✅") == 5
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Tests for snapshot_budget: parsing, compaction and same-page diffs of Playwright MCP snapshots
+Run with: python -m pytest test_snapshot_budget.py
+"""
+
+import json
+
+import snapshot_budget
+
+
+def make_snapshot(tree: str, url: str = "https://www.grailed.com/sell/new") -> str:
+    return f"### Page state\n- Page URL: {url}\n- Page Title: Sell\n- Page Snapshot:\n```yaml\n{tree}\n```\n"
+
+
+SELL_FORM = """- heading "Sell" [level=1] [ref=e1]
+- generic [ref=e2]:
+  - textbox "Designer" [ref=e3]
+  - textbox "Price" [ref=e4]
+  - checkbox "Accept offers" [ref=e5]
+  - link "Help" [ref=e6]:
+    - /url: /help
+- button "Publish" [ref=e7]"""
+
+
+def elements_of(tree: str):
+    return snapshot_budget.parse_elements(tree)
+
+
+def test_parse_elements_reads_role_name_ref_and_folds_properties():
+    elements = elements_of(SELL_FORM)
+
+    assert [e["role"] for e in elements] == ["heading", "generic", "textbox", "textbox", "checkbox", "link", "button"]
+    assert elements[3] == {"role": "textbox", "name": "Price", "ref": "e4", "line": '- textbox "Price" [ref=e4]'}
+    assert elements[5]["line"] == '- link "Help" [ref=e6] url: /help'
+
+
+def test_split_snapshot_without_tree():
+    header, tree, trailer = snapshot_budget.split_snapshot("### Result\nno snapshot here")
+
+    assert tree is None
+    assert header == "### Result\nno snapshot here"
+    assert trailer == ""
+
+
+def test_page_url():
+    assert snapshot_budget.page_url(make_snapshot(SELL_FORM)) == "https://www.grailed.com/sell/new"
+
+
+def test_compact_snapshot_keeps_highest_priority_elements_in_document_order():
+    compact = snapshot_budget.compact_snapshot(make_snapshot(SELL_FORM), max_elements=3)
+
+    assert "- Showing 3 of 7 elements" in compact
+    _, tree, _ = snapshot_budget.split_snapshot(compact)
+    assert [e["ref"] for e in elements_of(tree)] == ["e3", "e4", "e7"]
+
+
+def test_compact_snapshot_respects_token_budget_and_adds_breadcrumb():
+    compact = snapshot_budget.compact_snapshot(
+        make_snapshot(SELL_FORM),
+        history=["https://www.grailed.com/", "https://www.grailed.com/sell/new"],
+        max_tokens=snapshot_budget.estimate_tokens(make_snapshot("")) + 10
+    )
+
+    assert "- Navigation: Home → Sell" in compact
+    _, tree, _ = snapshot_budget.split_snapshot(compact)
+    assert len(elements_of(tree)) < 7
+
+
+def test_select_elements_matches_compact_snapshot():
+    elements = elements_of(SELL_FORM)
+
+    kept = snapshot_budget.select_elements(elements, max_elements=3)
+
+    assert [elements[i]["ref"] for i in kept] == ["e3", "e4", "e7"]
+
+
+def test_diff_reports_filled_value_as_modified():
+    filled = SELL_FORM.replace('textbox "Price" [ref=e4]', 'textbox "Price" [ref=e4]: "120"')
+
+    diff = snapshot_budget.diff_elements(elements_of(SELL_FORM), elements_of(filled))
+
+    assert diff["modified"] == ['- textbox "Price" [ref=e4]: "120"']
+    assert "e4" not in diff["unchanged"]
+    assert diff["added"] == [] and diff["removed"] == []
+
+
+def test_diff_reports_new_state_as_modified():
+    checked = SELL_FORM.replace('checkbox "Accept offers" [ref=e5]', 'checkbox "Accept offers" [checked] [ref=e5]')
+
+    diff = snapshot_budget.diff_elements(elements_of(SELL_FORM), elements_of(checked))
+
+    assert diff["modified"] == ['- checkbox "Accept offers" [checked] [ref=e5]']
+    assert "e5" not in diff["unchanged"]
+
+
+def test_diff_added_and_removed():
+    changed = SELL_FORM.replace('- button "Publish" [ref=e7]', '- dialog "Log In" [ref=e8]')
+
+    diff = snapshot_budget.diff_elements(elements_of(SELL_FORM), elements_of(changed))
+
+    assert diff["added"] == ['- dialog "Log In" [ref=e8]']
+    assert diff["removed"] == ["e7"]
+    assert diff["unchanged"] == ["e1", "e2", "e3", "e4", "e5", "e6"]
+
+
+def test_diff_returns_none_when_page_changed_too_much():
+    other = '- heading "Profile" [ref=f1]\n- link "Settings" [ref=f2]'
+
+    assert snapshot_budget.diff_elements(elements_of(SELL_FORM), elements_of(other)) is None
+
+
+def test_render_diff_keeps_header_and_embeds_json():
+    diff = {"unchanged": ["e1"], "added": [], "removed": [], "modified": []}
+
+    rendered = snapshot_budget.render_diff(make_snapshot(SELL_FORM), diff)
+
+    assert rendered.startswith("### Page state\n- Page URL: https://www.grailed.com/sell/new")
+    body = rendered.split("```json\n", 1)[1].split("\n```", 1)[0]
+    assert json.loads(body) == diff